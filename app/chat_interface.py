@@ -1,51 +1,65 @@
 # app/chat_interface.py
 import time
-from typing import Tuple, List
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Tuple, List, Optional
 import textwrap
 import re
 import os
 import xml.etree.ElementTree as ET
 
-from huggingface_hub import InferenceClient
-import chromadb
-from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
+from dotenv import load_dotenv
+load_dotenv()  # before the app modules below read their configuration
 
-from dotenv import load_dotenv  
-load_dotenv()
+from app.utils import answer_cache
+from app.utils.context_builder import pack_context, filter_citations
+from app.utils.lexical_index import reciprocal_rank_fusion
+from app.utils.llm_backends import LLM_SINGLE_FLIGHT, SingleFlight, get_llm_backend, prompt_key
+from app.utils.metrics import CHAT_STAGE_SECONDS, LLM_REQUESTS, Gauge
+from app.utils.scoring import distance_to_score
+from app.utils.session_memory import load_history, save_turn
+from app.utils.stream_parser import ResponseStreamParser
+from app.utils.tokens import estimate_tokens
+from app.utils.topics import normalize_topic
+from app.utils.tracing import log_event
+from app.utils.vector_store import UnknownTopic, VectorStore, get_vector_store
 
 # === CONFIG ===
-CHROMA_DB_DIR = os.path.join(os.path.dirname(__file__), "chroma_db_patents")
-COLLECTION_NAME = "patent_docs"
-MISTRAL_MODEL = "mistralai/Mistral-7B-Instruct-v0.3"
-HF_TOKEN = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not HF_TOKEN:
-    raise EnvironmentError("Please set HF_TOKEN or HUGGINGFACEHUB_API_TOKEN")
-
-# === DB + EMBEDDING ===
-client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
-collection = client.get_collection(COLLECTION_NAME, embedding_function=DefaultEmbeddingFunction())
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "chunks")  # "chunks" or "documents"
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "24"))  # passages offered to the context builder
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+VECTOR_K = int(os.getenv("VECTOR_K", "32"))  # candidates from Chroma before fusion
+LEXICAL_K = int(os.getenv("LEXICAL_K", "32"))  # candidates from BM25 before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+RETRIEVAL_CONCURRENCY = int(os.getenv("RETRIEVAL_CONCURRENCY", "4"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "10"))
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "16"))
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "60"))
 
 # === LLM ===
-inference = InferenceClient(model=MISTRAL_MODEL, api_key=HF_TOKEN)
+llm_backend = get_llm_backend()
+single_flight = SingleFlight()
+Gauge("patentai_llm_single_flight", "Single-flight LLM calls started, coalesced and in flight.",
+      ["stat"]).set_function(single_flight.stats)
 
-# === MEMORY ===
-memory = ConversationBufferMemory(memory_key="history", input_key="question")
+# === CONCURRENCY ===
+# Retrieval (ONNX embedding + vector search) is CPU-bound and synchronous, so it runs on
+# a dedicated pool; generation is I/O-bound and only needs an in-flight cap.
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_CONCURRENCY, thread_name_prefix="retrieval")
+generation_semaphore = asyncio.Semaphore(GENERATION_CONCURRENCY)
 
 # === PROMPT ===
-prompt_context = PromptTemplate(
-    input_variables=["history", "context", "question"],
-    template=textwrap.dedent("""
-        Previous history:
-        {history}
+prompt_context = textwrap.dedent("""
+    Previous history:
+    {history}
 
-        Patent context:
-        {context}
+    Patent context:
+    {context}
 
-        User question: {question}
-    """)
-)
+    User question: {question}
+""")
 
 system_message = textwrap.dedent("""
 You are a helpful assistant answering queries to the user politely and concisely.
@@ -73,6 +87,14 @@ Follow the below instructions carefully:
 """)
 
 # === UTIL ===
+class StageTimeout(Exception):
+    """Raised when a pipeline stage (retrieval or generation) exceeds its timeout."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:.0f}s")
+        self.stage = stage
+
+
 def extract_response_xml(text: str) -> str:
     starts = [m.start() for m in re.finditer(r"<response", text, re.IGNORECASE)]
     ends = [m.end() for m in re.finditer(r"</response>", text, re.IGNORECASE)]
@@ -93,29 +115,279 @@ def parse_response(xml_text: str) -> Tuple[str, List[str]]:
         ids = re.findall(r'<pid>(\d+)</pid>', xml_text) + re.findall(r'<id>(\d+)</id>', xml_text)
         return ans, list(dict.fromkeys(ids))
 
+def embed_query(store: VectorStore, message: str) -> List[float]:
+    return store.embed([message])[0]
+
+
+def search(store: VectorStore, target, message: str, embedding, k: int) -> List[Dict]:
+    """
+    Top-k passages ({"id", "text", "metadata", "score"}) from a collection, best first.
+    With HYBRID_RETRIEVAL, VECTOR_K nearest neighbours and LEXICAL_K BM25 hits are
+    merged by reciprocal rank fusion, so exact claim terms and patent numbers are
+    found even when embeddings miss them.
+    """
+    query = {"query_embeddings": [embedding]} if embedding is not None else {"query_texts": [message]}
+    with CHAT_STAGE_SECONDS.time(stage="vector_search"):
+        results = target.query(**query, n_results=VECTOR_K if HYBRID_RETRIEVAL else k,
+                               include=["documents", "metadatas", "distances"])
+    vector_ids = results["ids"][0]
+    passages = {
+        doc_id: {"id": doc_id, "text": text, "metadata": metadata or {}, "score": distance_to_score(distance)}
+        for doc_id, text, metadata, distance in zip(
+            vector_ids, results["documents"][0], results["metadatas"][0], results["distances"][0])
+    }
+    if not HYBRID_RETRIEVAL:
+        return [passages[doc_id] for doc_id in vector_ids[:k]]
+
+    with CHAT_STAGE_SECONDS.time(stage="lexical_search"):
+        store.ensure_lexical(target)
+        lexical_ids = [doc_id for doc_id, _ in store.lexical_index.search(target.name, message, LEXICAL_K)]
+    fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=RRF_K)[:k]
+    missing = [doc_id for doc_id, _ in fused if doc_id not in passages]
+    if missing:
+        found = target.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+            passages[doc_id] = {"id": doc_id, "text": text, "metadata": metadata or {}}
+    ranked = []
+    for doc_id, score in fused:
+        if doc_id in passages:
+            passages[doc_id]["score"] = score
+            ranked.append(passages[doc_id])
+    return ranked
+
+
+def retrieve_context(store: VectorStore, message: str, embedding=None,
+                     topic: Optional[str] = None) -> Tuple[str, List[str], int]:
+    """
+    Build the patent context for a question, searching only the topic's partition if given.
+    CONTEXT_CANDIDATES section chunks ("chunks" mode) or whole patents ("documents"
+    mode, or an empty chunk index) are packed into CONTEXT_TOKEN_BUDGET by the
+    context builder. A precomputed query embedding skips re-embedding the message.
+    Returns (context, pids in the context, context tokens).
+    """
+    if store.remote:
+        return store.retrieve_context(message, embedding, topic)
+    documents_target, chunks_target = store.collections(topic)
+    target = chunks_target if RETRIEVAL_MODE == "chunks" and chunks_target.count() > 0 else documents_target
+    passages = search(store, target, message, embedding, CONTEXT_CANDIDATES)
+    with CHAT_STAGE_SECONDS.time(stage="context_packing"):
+        return pack_context(passages)
+
+
+async def run_retrieval_stage(fn, *args):
+    """Run a retrieval step on the bounded retrieval pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Executor threads don't inherit context variables; carry the trace ID over
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(retrieval_executor, call),
+            timeout=RETRIEVAL_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        raise StageTimeout("retrieval", RETRIEVAL_TIMEOUT)
+
+
+async def generate(messages: List[dict], max_tokens: int = 512, temperature: float = 0.0) -> str:
+    """
+    Call the LLM backend, capped at GENERATION_CONCURRENCY in flight.
+    Identical prompts already in flight share one call (LLM_SINGLE_FLIGHT).
+    """
+    async def call() -> str:
+        async with generation_semaphore:
+            return await llm_backend.complete(messages, max_tokens=max_tokens, temperature=temperature)
+
+    try:
+        if LLM_SINGLE_FLIGHT:
+            key = prompt_key(messages, max_tokens=max_tokens, temperature=temperature)
+            output = await asyncio.wait_for(single_flight.do(key, call), timeout=GENERATION_TIMEOUT)
+        else:
+            output = await asyncio.wait_for(call(), timeout=GENERATION_TIMEOUT)
+    except asyncio.TimeoutError:
+        LLM_REQUESTS.inc(backend=llm_backend.name, outcome="timeout")
+        raise StageTimeout("generation", GENERATION_TIMEOUT)
+    except Exception:
+        LLM_REQUESTS.inc(backend=llm_backend.name, outcome="error")
+        raise
+    LLM_REQUESTS.inc(backend=llm_backend.name, outcome="ok")
+    return output
+
+
+async def generate_stream(messages: List[dict], max_tokens: int = 512,
+                          temperature: float = 0.0) -> AsyncIterator[str]:
+    """
+    Stream the LLM backend's completion as it is generated, under the same
+    GENERATION_CONCURRENCY cap, with GENERATION_TIMEOUT for the whole completion.
+    Streams are never shared, so single-flight does not apply.
+    """
+    deadline = time.monotonic() + GENERATION_TIMEOUT
+    async with generation_semaphore:
+        chunks = llm_backend.stream(messages, max_tokens=max_tokens, temperature=temperature)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - time.monotonic())
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except asyncio.TimeoutError:
+            LLM_REQUESTS.inc(backend=llm_backend.name, outcome="timeout")
+            raise StageTimeout("generation", GENERATION_TIMEOUT)
+        except Exception:
+            LLM_REQUESTS.inc(backend=llm_backend.name, outcome="error")
+            raise
+        finally:
+            await chunks.aclose()
+    LLM_REQUESTS.inc(backend=llm_backend.name, outcome="ok")
+
+
+class PreparedQuery:
+    """
+    A question ready for generation: its embedding, the retrieved context,
+    history and prompt messages, or the cached answer if there was one. Also
+    keeps the per-stage latencies measured so far.
+    """
+
+    def __init__(self, message: str, redis_client, session_id: Optional[str], topic: Optional[str]):
+        self.message = message
+        self.redis_client = redis_client
+        self.session_id = session_id
+        self.topic = topic
+        self.scope = f"topic:{topic}" if topic else ""
+        self.use_memory = redis_client is not None and session_id is not None
+        self.use_cache = False
+        self.embedding = None
+        self.cached = None
+        self.messages: List[dict] = []
+        self.prompt = ""
+        self.history_text = ""
+        self.context_pids: List[str] = []
+        self.context_tokens = 0
+        self.latency: Dict[str, float] = {}
+        self.started = self.mark = time.perf_counter()
+
+    def lap(self, stage: str, since: float = None) -> float:
+        """Record a stage as the time since `since` (default: the previous lap)."""
+        now = time.perf_counter()
+        elapsed = now - (self.mark if since is None else since)
+        self.latency[stage] = round(elapsed * 1000, 1)
+        CHAT_STAGE_SECONDS.observe(elapsed, stage=stage)
+        self.mark = now
+        return now
+
+
 # === MAIN FUNCTION ===
-async def run_query(message: str) -> Tuple[str, List[str]]:
-    search = collection.query(query_texts=[message], n_results=3)
-    documents = search.get("documents", [[]])[0]
-    context = "\n---\n".join(documents)
-    history_text = memory.load_memory_variables({})["history"] or ""
+async def prepare_query(message: str, redis_client=None, session_id: str = None,
+                        topic: Optional[str] = None, store: Optional[VectorStore] = None) -> PreparedQuery:
+    """
+    Everything before generation: embed the question, load the history, try the
+    answer cache and, on a miss, retrieve the context. Questions with history skip the cache.
+    Raises UnknownTopic, StageTimeout or RetrievalServiceError.
+    """
+    store = store or get_vector_store()
+    topic = normalize_topic(topic) if topic else None
+    query = PreparedQuery(message, redis_client, session_id, topic)
+    if topic:
+        await run_retrieval_stage(store.require_topic, topic)  # fail fast on unknown topics
+    # History comes from Redis while the question is embedded on the pool
+    query.embedding, query.history_text = await asyncio.gather(
+        run_retrieval_stage(embed_query, store, message),
+        load_history(redis_client, session_id) if query.use_memory else asyncio.sleep(0, result=""),
+    )
+    query.lap("embedding")
 
-    if len(history_text) > 1000:
-        history_text = history_text[-500:]
-    if len(context) > 2000:
-        context = context[:2000] + "\n[...context truncated...]"
+    query.use_cache = redis_client is not None and not query.history_text
+    if query.use_cache:
+        query.cached = await answer_cache.lookup(redis_client, message, query.embedding, scope=query.scope)
+        query.lap("cache_lookup")
+        if query.cached:
+            return query
 
-    prompt = prompt_context.format(history=history_text, context=context, question=message)
+    context, query.context_pids, query.context_tokens = await run_retrieval_stage(
+        retrieve_context, store, message, query.embedding, topic)
+    query.lap("retrieval")
 
-    messages = [
+    query.prompt = prompt_context.format(history=query.history_text, context=context, question=message)
+    query.messages = [
         {"role": "system", "content": system_message},
-        {"role": "user", "content": prompt},
+        {"role": "user", "content": query.prompt},
     ]
+    return query
+
+
+async def finish_query(query: PreparedQuery, raw_output: str, answer: str,
+                       cited: List[str]) -> Tuple[str, List[str], Dict]:
+    """Filter citations, save the turn and the cached answer, and log the exchange."""
+    if query.cached:
+        answer, pids = query.cached
+        usage = {"cached": True}
+    else:
+        # Only cite patents whose text the model was actually given
+        pids = filter_citations(cited, query.context_pids)
+        query.lap("parse")
+        usage = {
+            "context_tokens": query.context_tokens,
+            "history_tokens": estimate_tokens(query.history_text),
+            "question_tokens": estimate_tokens(query.message),
+            "prompt_tokens": estimate_tokens(system_message) + estimate_tokens(query.prompt),
+            "completion_tokens": estimate_tokens(raw_output),
+            "context_patents": len(query.context_pids),
+        }
+
+    if query.use_memory:
+        await save_turn(query.redis_client, query.session_id, query.message, answer)
+    if query.use_cache and not query.cached:
+        await answer_cache.store(query.redis_client, query.message, answer, pids, query.embedding, scope=query.scope)
+    query.lap("total", query.started)
+    usage["latency_ms"] = query.latency
+    if query.cached:
+        log_event("chat_query", topic=query.topic, cached=True, latency_ms=query.latency)
+    else:
+        log_event("chat_query", topic=query.topic, cached=False, citations=len(pids), usage=usage)
+    return answer, pids, usage
+
+
+async def run_query(message: str, redis_client=None, session_id: str = None,
+                    topic: Optional[str] = None, store: Optional[VectorStore] = None) -> Tuple[str, List[str], Dict]:
+    """
+    Answer a question with retrieval-augmented generation, optionally limited to one topic.
+    With a Redis client, answers are cached and, given a session_id, the
+    conversation history for that session is loaded and saved.
+    Uses the process-wide vector store unless one is given.
+    Returns (answer, cited pids, estimated token usage per stage), the usage
+    including each stage's latency in milliseconds under "latency_ms".
+    """
+    query = await prepare_query(message, redis_client, session_id, topic, store)
+    if query.cached:
+        return await finish_query(query, "", "", [])
+
+    raw_output = await generate(query.messages)
+    query.lap("generation")
+    answer, cited = parse_response(extract_response_xml(raw_output))
+    return await finish_query(query, raw_output, answer, cited)
 
-    response = inference.chat_completion(messages=messages, max_tokens=512, temperature=0.0)
-    raw_output = response.choices[0].message.content
 
-    xml = extract_response_xml(raw_output)
-    answer, pids = parse_response(xml)
-    memory.save_context({"question": message}, {"answer": answer})
-    return answer, pids
+async def stream_query(query: PreparedQuery) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Answer a prepared question as events while the LLM generates it:
+    ("answer", {"text"}) for each new piece of the answer, parsed incrementally
+    from the <answer> element, then ("citations", {"answer", "citations", "usage"}).
+    A cached answer arrives as a single "answer" event. The usage adds the
+    time to the first generated token as latency_ms["first_token"].
+    """
+    if query.cached:
+        yield "answer", {"text": query.cached[0]}
+        answer, pids, usage = await finish_query(query, "", "", [])
+    else:
+        parser = ResponseStreamParser()
+        generation_started = query.mark
+        async for chunk in generate_stream(query.messages):
+            if "first_token" not in query.latency:
+                query.lap("first_token", generation_started)
+            text, _ = parser.feed(chunk)
+            if text:
+                yield "answer", {"text": text}
+        query.lap("generation", generation_started)
+        answer, cited = parser.close()
+        answer, pids, usage = await finish_query(query, parser.text, answer, cited)
+    yield "citations", {"answer": answer, "citations": pids, "usage": usage}
@@ -1,9 +1,13 @@
 import os
+import sys
 import time
 import csv
 import random
 import requests
-from bs4 import BeautifulSoup
+
+# Allow importing the shared extractors when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from app.utils.extractors import get_extractor
 
 # === Configuration ===
 BASE_URL = "https://www.freepatentsonline.com"
@@ -39,18 +43,8 @@ def parse_patent(url, pid):
         print(f"🔍 Parsing: {url}")
         res = session.get(url, timeout=20)
         res.raise_for_status()
-        soup = BeautifulSoup(res.content, 'html.parser')
-
         data = {'pid': pid}
-        for div in soup.find_all('div', class_='disp_doc2'):
-            title_div = div.find('div', class_='disp_elm_title')
-            text_div = div.find('div', class_='disp_elm_text')
-            if not title_div or not text_div:
-                continue
-            title = title_div.get_text(strip=True).replace(":", "")
-            text = text_div.get_text(separator=" ", strip=True)
-            if title in ["Abstract", "Claims", "Description"]:
-                data[title] = text
+        data.update(get_extractor().extract_sections(res.content))
         return data if len(data) > 1 else None
     except Exception as e:
         print(f"❌ Error parsing {pid}: {e}")
@@ -67,9 +61,7 @@ def get_patent_ids(query, page, retries=3):
         try:
             res = session.get(url, timeout=20)
             res.raise_for_status()
-            soup = BeautifulSoup(res.content, 'html.parser')
-            td_list = soup.find_all('td', attrs={'width': '15%', 'valign': 'top'})
-            return [td.get_text(strip=True) for td in td_list if td.get_text(strip=True)]
+            return get_extractor().extract_patent_ids(res.content)
         except Exception as e:
             print(f"⚠️ Retry {attempt + 1}/{retries} failed: {e}")
             time.sleep((2 ** attempt) + 1)
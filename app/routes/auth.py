@@ -1,13 +1,13 @@
 # app/routes/auth.py
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
 from uuid import uuid4
-import os
 
-router = APIRouter()
+from app.utils.password_hasher import HasherBusy, hasher
+from app.utils.session_cache import create_session, end_session, get_session_user
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+router = APIRouter()
 
 
 # === MODELS ===
@@ -26,50 +26,71 @@ class SessionAuth(BaseModel):
 
 
 # === UTILS ===
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        return await hasher.hash(password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins in progress, retry shortly",
+                            headers={"Retry-After": "1"})
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await hasher.verify(password, hashed)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins in progress, retry shortly",
+                            headers={"Retry-After": "1"})
 
 
 def generate_session_id() -> str:
     return str(uuid4())
 
 
-# === DEPENDENCY ===
-async def get_current_user(request: Request, session: SessionAuth) -> str:
-    redis_client = request.app.state.redis
-    user_email = await redis_client.get(session.session_id)
+async def require_session(request: Request, session_id: str) -> str:
+    """Return the session's user email or raise 401."""
+    user_email = await get_session_user(request.app.state.redis, session_id)
     if not user_email:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired session")
     return user_email
 
 
+# === DEPENDENCY ===
+async def get_current_user(request: Request, session: SessionAuth) -> str:
+    return await require_session(request, session.session_id)
+
+
 # === ROUTES ===
 @router.post("/register")
 async def register_user(request: Request, data: RegisterRequest):
     db = request.app.state.mongo
-    existing = await db.users.find_one({"email": data.email})
+    existing = await db.users.find_one({"email": data.email}, projection={"_id": 1})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = hash_password(data.password)
-    await db.users.insert_one({"email": data.email, "password": hashed_pw})
+    hashed_pw = await hash_password(data.password)
+    try:
+        await db.users.insert_one({"email": data.email, "password": hashed_pw})
+    except DuplicateKeyError:  # lost a race with a concurrent registration
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"message": "User registered successfully"}
 
 
 @router.post("/login")
 async def login_user(request: Request, data: LoginRequest):
-    print("DEBUG_MONGO_URI", os.getenv("MONGO_URI"))
     db = request.app.state.mongo
     redis_client = request.app.state.redis
 
-    user = await db.users.find_one({"email": data.email})
-    if not user or not verify_password(data.password, user["password"]):
+    user = await db.users.find_one({"email": data.email}, projection={"email": 1, "password": 1})
+    if not user or not await verify_password(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     session_id = generate_session_id()
-    await redis_client.set(session_id, user["email"], ex=86400)  # 1 day expiry
+    await create_session(redis_client, session_id, user["email"])  # 1 day expiry
     return {"message": "Login successful", "session_id": session_id}
+
+
+@router.post("/logout")
+async def logout_user(request: Request, session: SessionAuth):
+    if not await end_session(request.app.state.redis, session.session_id):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired session")
+    return {"message": "Logged out"}
@@ -1,29 +1,150 @@
 # app/routes/chat.py
-from fastapi import APIRouter, Request, HTTPException
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app.routes.auth import require_session
+from app.utils import transcripts
+from app.utils.session_cache import get_session_user
+from app.utils.topics import normalize_topic
+from app.utils.tracing import log_event
+
 router = APIRouter()
 
 
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    topic: Optional[str] = None  # limit retrieval to one ingested topic
 
 
 @router.post("/chat")
 async def chat_with_ai(request: Request, data: ChatRequest):
     redis_client = request.app.state.redis
-    user_email = await redis_client.get(data.session_id)
+    user_email = await get_session_user(redis_client, data.session_id)
 
     if not user_email:
         raise HTTPException(
             status_code=401, detail="Session expired or invalid")
 
-    from app.chat_interface import run_query
-    answer, pids = await run_query(data.message)
+    try:
+        topic = normalize_topic(data.topic) if data.topic else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from app.chat_interface import run_query, StageTimeout, UnknownTopic
+    from app.utils.retrieval_service import RetrievalServiceError
+    try:
+        answer, pids, usage = await run_query(
+            data.message, redis_client, data.session_id, topic, store=request.app.state.vector_store)
+    except UnknownTopic as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RetrievalServiceError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # Written to Mongo in the background, batched with other exchanges
+    request.app.state.transcripts.submit({
+        "user": user_email,
+        "session_id": data.session_id,
+        "topic": topic,
+        "question": data.message,
+        "answer": answer,
+        "citations": pids,
+        "usage": usage,
+    })
 
     return {
         "answer": answer,
         "citations": pids,
+        "usage": usage,
         "user": user_email
     }
+
+
+def sse(event: str, data: dict) -> str:
+    """One server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: Request, data: ChatRequest):
+    """
+    Like /chat, but the answer is sent as server-sent events while the LLM
+    generates it: `answer` events with text deltas, then one `citations`
+    event with the full answer, citations and usage. Errors during generation
+    arrive as an `error` event, since the response has already started.
+    """
+    redis_client = request.app.state.redis
+    user_email = await get_session_user(redis_client, data.session_id)
+
+    if not user_email:
+        raise HTTPException(
+            status_code=401, detail="Session expired or invalid")
+
+    try:
+        topic = normalize_topic(data.topic) if data.topic else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from app.chat_interface import prepare_query, stream_query, StageTimeout, UnknownTopic
+    from app.utils.retrieval_service import RetrievalServiceError
+    try:
+        query = await prepare_query(
+            data.message, redis_client, data.session_id, topic, store=request.app.state.vector_store)
+    except UnknownTopic as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RetrievalServiceError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            async for event, payload in stream_query(query):
+                if event == "citations":
+                    request.app.state.transcripts.submit({
+                        "user": user_email,
+                        "session_id": data.session_id,
+                        "topic": topic,
+                        "question": data.message,
+                        "answer": payload["answer"],
+                        "citations": payload["citations"],
+                        "usage": payload["usage"],
+                    })
+                    payload["user"] = user_email
+                yield sse(event, payload)
+        except StageTimeout as e:
+            yield sse("error", {"status": 504, "detail": str(e)})
+        except Exception as e:
+            log_event("chat_stream_failed", level=logging.ERROR, error=repr(e))
+            yield sse("error", {"status": 502, "detail": "Answer generation failed"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/chat/history")
+async def chat_history(request: Request, session_id: str,
+                       cursor: Optional[str] = None, topic: Optional[str] = None,
+                       limit: int = Query(transcripts.HISTORY_PAGE_SIZE, ge=1, le=transcripts.HISTORY_MAX_PAGE_SIZE)):
+    """The user's past exchanges, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    user_email = await require_session(request, session_id)
+    try:
+        topic = normalize_topic(topic) if topic else None
+        items, next_cursor = await transcripts.history(
+            request.app.state.mongo, user_email, cursor=cursor, limit=limit, topic=topic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/chat/cache/stats")
+async def chat_cache_stats(request: Request, session_id: str):
+    await require_session(request, session_id)
+    from app.utils.answer_cache import stats
+    return await stats(request.app.state.redis)
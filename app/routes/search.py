@@ -0,0 +1,50 @@
+# app/routes/search.py
+from typing import List, Optional
+from fastapi import APIRouter, Request, HTTPException
+from pydantic import BaseModel, Field
+
+from app.routes.auth import require_session
+from app.utils.batch_search import SEARCH_DEFAULT_K, SEARCH_MAX_K, SEARCH_MAX_QUERIES, SECTIONS
+from app.utils.topics import normalize_topic
+
+router = APIRouter()
+
+
+class SearchRequest(BaseModel):
+    session_id: str
+    queries: List[str] = Field(min_length=1, max_length=SEARCH_MAX_QUERIES)
+    k: int = Field(SEARCH_DEFAULT_K, ge=1, le=SEARCH_MAX_K)
+    topic: Optional[str] = None  # limit the search to one ingested topic
+    sections: Optional[List[str]] = None  # any of abstract, claim, description
+
+
+@router.post("/search")
+async def search_patents(request: Request, data: SearchRequest):
+    """Ranked patents for each query text, from one batched vector search and no LLM call."""
+    user_email = await require_session(request, data.session_id)
+    if any(not query.strip() for query in data.queries):
+        raise HTTPException(status_code=400, detail="Queries must not be empty")
+    unknown = set(data.sections or ()) - set(SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {sorted(unknown)}; use {list(SECTIONS)}")
+    try:
+        topic = normalize_topic(data.topic) if data.topic else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from app.chat_interface import run_retrieval_stage, StageTimeout, UnknownTopic
+    from app.utils.batch_search import search_batch
+    from app.utils.retrieval_service import RetrievalServiceError
+    try:
+        results = await run_retrieval_stage(
+            search_batch, request.app.state.vector_store, data.queries, data.k, topic, data.sections)
+    except UnknownTopic as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RetrievalServiceError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"results": results, "user": user_email}
@@ -1,50 +1,130 @@
 # app/routes/topic.py
 import os
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 
-from app.routes.auth import get_current_user
-from app.utils.patent_parser import parse_and_save_topic
-from app.utils.vector_uploader import load_csv_to_vectordb
+from app.routes.auth import get_current_user, require_session
+from app.utils.jobs import submit_job, get_job, get_topic_job
+from app.utils import answer_cache, patent_store
+from app.utils.topics import normalize_topic
 
 router = APIRouter()
 
+CRAWL_MODE = os.getenv("CRAWL_MODE", "async")  # "async" or "sync"
+
 class TopicInitRequest(BaseModel):
     topic: str
 
+
+async def store_call(fn, *args):
+    """Run a vector store call off the event loop; 503 when the retrieval service is down."""
+    from app.utils.retrieval_service import RetrievalServiceError
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except RetrievalServiceError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def make_topic_runner(topic: str, redis_client, store):
+    """Build the background job body: crawl the topic, then embed it into the vector store."""
+    async def run(progress) -> str:
+        # Crawler and ingestion modules are only needed once a job runs
+        from app.utils.vector_uploader import load_topic_to_vectordb
+
+        # Step 1: Parse and save
+        try:
+            if CRAWL_MODE == "async":
+                from app.utils.async_crawler import parse_and_save_topic_async
+                await parse_and_save_topic_async(topic, progress=progress.update)
+            else:
+                from app.utils.patent_parser import parse_and_save_topic
+                await asyncio.to_thread(parse_and_save_topic, topic, progress.update)
+        except Exception as e:
+            raise RuntimeError(f"Parsing failed: {str(e)}")
+
+        # Step 2: Insert into vector DB
+        try:
+            count = await asyncio.to_thread(load_topic_to_vectordb, topic, progress=progress.update, store=store)
+        except Exception as e:
+            raise RuntimeError(f"Vector DB insert failed: {str(e)}")
+
+        # New documents can change answers, so drop cached ones
+        if count:
+            await answer_cache.invalidate(redis_client)
+
+        return f"Inserted {count} patents for topic '{topic}' into ChromaDB."
+    return run
+
+
 @router.post("/topic/initiate")
 async def initiate_topic(
     request: Request,
     req: TopicInitRequest,
     user_email: str = Depends(get_current_user)
 ):
-    topic = req.topic.strip().lower().replace(" ", "_")
+    try:
+        topic = normalize_topic(req.topic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    redis_client = request.app.state.redis
+    store = request.app.state.vector_store
 
-    parsed_dir = os.path.join(os.path.dirname(__file__), "..", "parsed_patents")
-    os.makedirs(parsed_dir, exist_ok=True)
-    csv_file = os.path.join(parsed_dir, f"{topic}_50patents.csv")
+    # Topics parsed before the patent store existed only have a CSV: convert it once
+    csv_file = os.path.join(patent_store.PARSED_DIR, f"{topic}_50patents.csv")
+    if not patent_store.is_complete(topic) and os.path.exists(csv_file):
+        await asyncio.to_thread(patent_store.convert_csv, csv_file, topic)
 
-    if os.path.exists(csv_file):
+    # A running job fills the topic's collections while embedding, so check for it first
+    if not await get_topic_job(redis_client, topic) and await store_call(store.topic_exists, topic):
         return {
             "status": "exists",
             "message": f"Topic '{topic}' already parsed and stored.",
             "user": user_email
         }
 
-    # Step 1: Parse and save
-    try:
-        csv_path = parse_and_save_topic(topic)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Parsing failed: {str(e)}")
-
-    # Step 2: Insert into vector DB
-    try:
-        count = load_csv_to_vectordb(csv_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Vector DB insert failed: {str(e)}")
-
+    job_id, attached = await submit_job(redis_client, topic, user_email, make_topic_runner(topic, redis_client, store))
     return {
-        "status": "success",
-        "message": f"Inserted {count} patents for topic '{topic}' into ChromaDB.",
+        "status": "running" if attached else "queued",
+        "job_id": job_id,
+        "message": f"{'Attached to running' if attached else 'Started'} ingestion job for topic '{topic}'.",
         "user": user_email
     }
+
+
+@router.get("/topic/status/{job_id}")
+async def topic_status(request: Request, job_id: str, session_id: str):
+    redis_client = request.app.state.redis
+    await require_session(request, session_id)
+
+    job = await get_job(redis_client, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+
+    for field in ("pages_fetched", "patents_parsed", "documents_embedded"):
+        job[field] = int(job.get(field, 0))
+    return job
+
+
+@router.get("/topics")
+async def get_topics(request: Request, session_id: str):
+    await require_session(request, session_id)
+    return {"topics": await store_call(request.app.state.vector_store.list_topics)}
+
+
+@router.delete("/topic/{topic}")
+async def delete_topic(request: Request, topic: str, session_id: str):
+    redis_client = request.app.state.redis
+    user_email = await require_session(request, session_id)
+    try:
+        topic = normalize_topic(topic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if await get_topic_job(redis_client, topic):
+        raise HTTPException(status_code=409, detail=f"Topic '{topic}' is being ingested")
+    if not await store_call(request.app.state.vector_store.drop_topic, topic):
+        raise HTTPException(status_code=404, detail=f"Topic '{topic}' not found")
+
+    await answer_cache.invalidate(redis_client)
+    return {"status": "dropped", "message": f"Topic '{topic}' removed.", "user": user_email}
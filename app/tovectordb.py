@@ -1,40 +1,22 @@
 import os
-import csv
-import uuid
 import sys
-from chromadb import PersistentClient
-from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
 
-# Fix field size limit for large patent data (Windows-safe)
-csv.field_size_limit(10_000_000)
+# Allow running as a script from any working directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-CSV_PATH = "parsed_patents/coffee_50patents.csv"
-CHROMA_DB_DIR = os.path.join(os.path.dirname(__file__), "chroma_db_patents")
-COLLECTION_NAME = "patent_docs"
+from app.utils.vector_store import CHROMA_DB_DIR, COLLECTION_NAME
+from app.utils.vector_uploader import load_csv_to_vectordb, load_topic_to_vectordb, BATCH_SIZE
 
-client = PersistentClient(path=CHROMA_DB_DIR)
-embedding_fn = DefaultEmbeddingFunction()
+CSV_PATH = os.path.join(os.path.dirname(__file__), "parsed_patents", "coffee_50patents.csv")
 
-collection = client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
+if __name__ == "__main__":
+    # Accepts a patent store topic name or a legacy CSV path
+    source = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else BATCH_SIZE
+    if source.endswith(".csv"):
+        count = load_csv_to_vectordb(source, batch_size=batch_size)
+    else:
+        count = load_topic_to_vectordb(source, batch_size=batch_size)
 
-with open(CSV_PATH, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        doc_id = str(uuid.uuid4())
-        document_text = "\n\n".join([
-            f"PID: {row.get('pid', '')}",
-            f"Abstract: {row.get('Abstract', '')}",
-            f"Claims: {row.get('Claims', '')}",
-            f"Description: {row.get('Description', '')}"
-        ])
-        collection.add(
-            documents=[document_text],
-            metadatas=[{"pid": row.get("pid", "")}],
-            ids=[doc_id]
-        )
-
-print(
-    f"✅ Successfully inserted documents into ChromaDB at '{CHROMA_DB_DIR}' in collection '{COLLECTION_NAME}'.")
+    print(
+        f"✅ Successfully inserted {count} documents into ChromaDB at '{CHROMA_DB_DIR}' in collection '{COLLECTION_NAME}'.")
@@ -0,0 +1,196 @@
+# utils/answer_cache.py
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# === CONFIGURATION ===
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+SEMANTIC_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # cosine similarity
+SEMANTIC_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_SYNC_OVERLAP = 5.0  # seconds of the index re-read on sync, for other workers' clock skew
+
+GENERATION_KEY = "answer_cache:generation"
+STATS_KEY = "answer_cache:stats"
+EXACT_KEY = "answer_cache:{}:exact:{}"
+SEMANTIC_VECTORS_KEY = "answer_cache:{}:vectors"
+SEMANTIC_INDEX_KEY = "answer_cache:{}:index"
+
+
+def normalize_question(question: str) -> str:
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip("?.! ")
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+def _encode_vector(embedding) -> str:
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector = vector / (np.linalg.norm(vector) or 1.0)
+    return base64.b64encode(vector.tobytes()).decode("ascii")
+
+
+def _decode_vector(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+class SemanticIndex:
+    """
+    A worker's copy of one namespace's semantic tier. Vectors stay in memory;
+    each sync only fetches the entries any worker stored since the last one,
+    rather than the whole hash on every lookup.
+    """
+
+    def __init__(self, namespace: str):
+        self.vectors_key = SEMANTIC_VECTORS_KEY.format(namespace)
+        self.index_key = SEMANTIC_INDEX_KEY.format(namespace)
+        self.vectors: OrderedDict = OrderedDict()
+        self.synced_at = 0.0  # newest index score seen
+        self.keys: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+
+    async def sync(self, redis_client):
+        since = max(0.0, self.synced_at - SEMANTIC_SYNC_OVERLAP)
+        entries = await redis_client.zrangebyscore(self.index_key, since, "+inf", withscores=True)
+        if not entries:
+            return
+        self.synced_at = max(self.synced_at, entries[-1][1])
+        new = [key for key, _ in entries if key not in self.vectors]
+        if not new:
+            return
+        for key, encoded in zip(new, await redis_client.hmget(self.vectors_key, new)):
+            if encoded:
+                self.vectors[key] = _decode_vector(encoded)
+        while len(self.vectors) > SEMANTIC_MAX_ENTRIES:
+            self.vectors.popitem(last=False)
+        self.matrix = None
+
+    def nearest(self, query: np.ndarray) -> Tuple[Optional[str], float]:
+        """The cached question key closest to the query, and its cosine similarity."""
+        if not self.vectors:
+            return None, 0.0
+        if self.matrix is None:
+            self.keys = list(self.vectors)
+            self.matrix = np.stack(list(self.vectors.values()))
+        scores = self.matrix @ query
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+# Per worker, for the current generation only; invalidate() moves every worker to a new one
+_semantic_indexes: Dict[str, SemanticIndex] = {}
+_semantic_generation: Optional[str] = None
+
+
+def _semantic_index(generation: str, namespace: str) -> SemanticIndex:
+    global _semantic_generation
+    if generation != _semantic_generation:
+        _semantic_indexes.clear()
+        _semantic_generation = generation
+    index = _semantic_indexes.get(namespace)
+    if index is None:
+        index = _semantic_indexes[namespace] = SemanticIndex(namespace)
+    return index
+
+
+async def _generation(redis_client) -> str:
+    return await redis_client.get(GENERATION_KEY) or "0"
+
+
+def _scoped(generation: str, scope: str) -> str:
+    """Narrow a generation to a scope (e.g. a topic) so scoped answers never mix."""
+    return f"{generation}:{scope}" if scope else generation
+
+
+async def _namespace(redis_client, scope: str) -> str:
+    return _scoped(await _generation(redis_client), scope)
+
+
+async def lookup(redis_client, question: str, embedding=None, scope: str = "") -> Optional[Tuple[str, List[str]]]:
+    """
+    Return a cached (answer, pids) for the question, or None.
+    Tries the exact tier (normalized question) first, then the semantic tier
+    (nearest cached question embedding above SEMANTIC_THRESHOLD).
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+
+    base = await _generation(redis_client)
+    generation = _scoped(base, scope)
+    key = question_key(question)
+    cached = await redis_client.get(EXACT_KEY.format(generation, key))
+    if cached:
+        await redis_client.hincrby(STATS_KEY, "exact_hits", 1)
+        entry = json.loads(cached)
+        return entry["answer"], entry["pids"]
+
+    if embedding is not None:
+        index = _semantic_index(base, generation)
+        await index.sync(redis_client)
+        best, score = index.nearest(_decode_vector(_encode_vector(embedding)))
+        if best is not None and score >= SEMANTIC_THRESHOLD:
+            # Evicted or expired entries are still in the worker's copy; the exact key decides
+            cached = await redis_client.get(EXACT_KEY.format(generation, best))
+            if cached:
+                await redis_client.hincrby(STATS_KEY, "semantic_hits", 1)
+                entry = json.loads(cached)
+                return entry["answer"], entry["pids"]
+
+    await redis_client.hincrby(STATS_KEY, "misses", 1)
+    return None
+
+
+async def store(redis_client, question: str, answer: str, pids: List[str], embedding=None, scope: str = ""):
+    """Cache an answer under the exact tier and, with an embedding, the semantic tier."""
+    if not ANSWER_CACHE_ENABLED:
+        return
+
+    generation = await _namespace(redis_client, scope)
+    key = question_key(question)
+    vectors_key = SEMANTIC_VECTORS_KEY.format(generation)
+    index_key = SEMANTIC_INDEX_KEY.format(generation)
+
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(EXACT_KEY.format(generation, key), json.dumps({"answer": answer, "pids": pids}), ex=ANSWER_CACHE_TTL)
+        if embedding is not None:
+            pipe.hset(vectors_key, key, _encode_vector(embedding))
+            pipe.zadd(index_key, {key: time.time()})
+            pipe.expire(vectors_key, ANSWER_CACHE_TTL)
+            pipe.expire(index_key, ANSWER_CACHE_TTL)
+            pipe.zcard(index_key)
+        results = await pipe.execute()
+
+    # Evict the oldest semantic entries beyond the cap
+    if embedding is not None and results[-1] > SEMANTIC_MAX_ENTRIES:
+        evicted = await redis_client.zpopmin(index_key, results[-1] - SEMANTIC_MAX_ENTRIES)
+        if evicted:
+            await redis_client.hdel(vectors_key, *[k for k, _ in evicted])
+
+
+async def invalidate(redis_client):
+    """Drop every cached answer by moving to a new generation; old keys expire via TTL."""
+    await redis_client.incr(GENERATION_KEY)
+    await redis_client.hincrby(STATS_KEY, "invalidations", 1)
+
+
+async def stats(redis_client) -> dict:
+    counters = {k: int(v) for k, v in (await redis_client.hgetall(STATS_KEY)).items()}
+    hits = counters.get("exact_hits", 0) + counters.get("semantic_hits", 0)
+    total = hits + counters.get("misses", 0)
+    return {
+        "exact_hits": counters.get("exact_hits", 0),
+        "semantic_hits": counters.get("semantic_hits", 0),
+        "misses": counters.get("misses", 0),
+        "invalidations": counters.get("invalidations", 0),
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+        "generation": int(await _generation(redis_client)),
+    }
@@ -0,0 +1,230 @@
+# utils/async_crawler.py
+import os
+import time
+import random
+import asyncio
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.utils import patent_parser, patent_store
+from app.utils.crawl_cache import CacheMiss, get_crawl_cache
+from app.utils.metrics import CRAWL_FAILURES, CRAWL_SECONDS
+from app.utils.patent_parser import (
+    USER_AGENTS, MAX_DOCS, MAX_FAILURES,
+    result_page_url, patent_url, extract_patent, extract_patent_ids, TopicOutput,
+)
+
+# === CONFIGURATION ===
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_RATE_PER_HOST = float(os.getenv("CRAWL_RATE_PER_HOST", "2.0"))  # requests per second
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "4"))
+CRAWL_RETRIES = int(os.getenv("CRAWL_RETRIES", "3"))
+CRAWL_BACKOFF = float(os.getenv("CRAWL_BACKOFF", "1.0"))  # seconds, doubled per attempt
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "20"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token-bucket rate limiter: `rate` tokens per second, up to `capacity` in a burst."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncCrawler:
+    """
+    Pooled HTTP client with a per-host token bucket, bounded concurrency and
+    retry with exponential backoff.
+    """
+
+    def __init__(self, concurrency: int = CRAWL_CONCURRENCY, rate: float = CRAWL_RATE_PER_HOST,
+                 burst: int = CRAWL_BURST, retries: int = CRAWL_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.pages_fetched = 0
+        self.client = httpx.AsyncClient(
+            headers={
+                "User-Agent": random.choice(USER_AGENTS),
+                "Accept-Language": "en-US,en;q=0.9"
+            },
+            timeout=CRAWL_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        GET a URL through the crawl cache, retrying transport errors and 429/5xx
+        responses with backoff. Cache hits skip the rate limiter entirely.
+        """
+        cache = get_crawl_cache()
+        entry = cache.lookup(url)
+        if entry and cache.is_fresh(entry):
+            cache.count(hit=True)
+            self.pages_fetched += 1
+            return await asyncio.to_thread(cache.load_body, entry)
+        if cache.mode == "offline":
+            raise CacheMiss(f"Not in crawl cache (offline mode): {url}")
+
+        for attempt in range(self.retries + 1):
+            await self.bucket(url).acquire()
+            try:
+                async with self.semaphore:
+                    res = await self.client.get(url, headers=cache.conditional_headers(entry))
+                if res.status_code == 304 and entry:
+                    cache.mark_revalidated(url, entry)
+                    cache.count(hit=True)
+                    self.pages_fetched += 1
+                    return await asyncio.to_thread(cache.load_body, entry)
+                if res.status_code in RETRY_STATUS and attempt < self.retries:
+                    retry_after = res.headers.get("Retry-After", "")
+                    delay = float(retry_after) if retry_after.isdigit() else CRAWL_BACKOFF * (2 ** attempt)
+                    print(f"⚠️ HTTP {res.status_code} for {url}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay + random.uniform(0, 0.25))
+                    continue
+                res.raise_for_status()
+                cache.count(hit=False)
+                if cache.enabled:
+                    await asyncio.to_thread(cache.store, url, res.content, res.headers)
+                self.pages_fetched += 1
+                return res.content
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                delay = CRAWL_BACKOFF * (2 ** attempt)
+                print(f"⚠️ {type(e).__name__} for {url}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                await asyncio.sleep(delay + random.uniform(0, 0.25))
+        raise RuntimeError(f"Retries exhausted for {url}")
+
+    async def get_patent_ids(self, query: str, page: int) -> List[str]:
+        try:
+            print(f"📄 Fetching patent ID list for topic '{query}', page {page}...")
+            with CRAWL_SECONDS.time(stage="fetch"):
+                html = await self.fetch(result_page_url(query, page))
+            with CRAWL_SECONDS.time(stage="parse"):
+                ids = await asyncio.to_thread(extract_patent_ids, html)
+            print(f"✅ Found {len(ids)} patent IDs on page {page}")
+            return ids
+        except Exception as e:
+            print(f"⚠️ Failed to fetch patent IDs on page {page}: {e}")
+            CRAWL_FAILURES.inc(page="results")
+            return []
+
+    async def parse_patent(self, pid: str) -> Optional[Dict[str, str]]:
+        url, real_pid = patent_url(pid)
+        try:
+            print(f"🔎 Fetching patent {real_pid} from URL: {url}")
+            with CRAWL_SECONDS.time(stage="fetch"):
+                html = await self.fetch(url)
+            with CRAWL_SECONDS.time(stage="parse"):
+                return await asyncio.to_thread(extract_patent, html, real_pid)
+        except Exception as e:
+            print(f"❌ Failed to parse patent {real_pid}: {e}")
+            CRAWL_FAILURES.inc(page="patent")
+            return None
+
+
+async def crawl_topic(query: str, output: TopicOutput, max_docs: int = MAX_DOCS,
+                      crawler: Optional[AsyncCrawler] = None, progress: Optional[Callable] = None) -> int:
+    """
+    Crawl result pages and patent pages for a topic concurrently, streaming each
+    parsed patent to `output` and resuming from its checkpoint.
+    The next result page is fetched while the current page's patents are in flight.
+    `progress(pages_fetched=..., patents_parsed=...)` is called after each batch.
+    Returns the number of patents written.
+    """
+    own_crawler = crawler is None
+    crawler = crawler or AsyncCrawler()
+    page = output.page
+    failures = 0
+    next_page = asyncio.create_task(crawler.get_patent_ids(query, page))
+
+    try:
+        while output.count < max_docs and failures < MAX_FAILURES:
+            ids = await next_page
+            await asyncio.to_thread(output.set_page, page)
+            page += 1
+            next_page = asyncio.create_task(crawler.get_patent_ids(query, page))
+
+            if not ids:
+                failures += 1
+                print(f"❌ No IDs found on page {page - 1}. Consecutive failures: {failures}")
+                continue
+            failures = 0
+
+            # Only request as many patents as are still needed, topping up on failures
+            ids = [pid for pid in ids if pid not in output.done]
+            while ids and output.count < max_docs:
+                needed = max_docs - output.count
+                window, ids = ids[:needed], ids[needed:]
+                results = await asyncio.gather(*(crawler.parse_patent(pid) for pid in window))
+                for pid, parsed in zip(window, results):
+                    if parsed:
+                        await asyncio.to_thread(output.append, pid, parsed)
+                print(f"✅ Total parsed: {output.count} / {max_docs}")
+                if progress:
+                    progress(pages_fetched=crawler.pages_fetched, patents_parsed=output.count)
+    finally:
+        next_page.cancel()
+        if own_crawler:
+            await crawler.client.aclose()
+
+    return output.count
+
+
+async def parse_and_save_topic_async(query: str, progress: Optional[Callable] = None) -> str:
+    """Async counterpart of patent_parser.parse_and_save_topic with the same store output."""
+    if patent_store.is_complete(query):
+        print(f"📂 Topic already in store: {query}")
+        return patent_store.partition_dir(query)
+
+    print(f"🚀 Starting async crawl for topic: {query} ({patent_parser.BASE_URL})")
+    start = time.perf_counter()
+    output = TopicOutput(query)
+    async with AsyncCrawler() as crawler:
+        await crawl_topic(query, output, crawler=crawler, progress=progress)
+        pages = crawler.pages_fetched
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ Fetched {pages} pages in {elapsed:.2f}s ({pages / elapsed if elapsed else 0:.1f} pages/s), "
+          f"crawl cache {get_crawl_cache().stats()}")
+
+    return output.finish()
+
+
+if __name__ == "__main__":
+    import sys
+    topic = sys.argv[1] if len(sys.argv) > 1 else input("Enter topic to search patents for: ").strip()
+    print(asyncio.run(parse_and_save_topic_async(topic)))
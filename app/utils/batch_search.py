@@ -0,0 +1,100 @@
+# utils/batch_search.py
+"""
+Batched prior-art search: many query texts embedded in one call and matched
+in one multi-query vector search, returning ranked patents with scores and
+the best matching snippet. No LLM is involved, so this is the fast path for
+screening lists of claims; /api/chat remains the path for answers.
+"""
+import os
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.metrics import SEARCH_QUERIES, SEARCH_STAGE_SECONDS
+from app.utils.scoring import distance_to_score
+
+if TYPE_CHECKING:  # importing the store pulls in chromadb; the routes import this module at startup
+    from app.utils.vector_store import VectorStore
+
+# === CONFIGURATION ===
+SEARCH_MAX_QUERIES = int(os.getenv("SEARCH_MAX_QUERIES", "256"))  # query texts per request
+SEARCH_DEFAULT_K = int(os.getenv("SEARCH_DEFAULT_K", "10"))
+SEARCH_MAX_K = int(os.getenv("SEARCH_MAX_K", "100"))
+SEARCH_OVERSAMPLE = int(os.getenv("SEARCH_OVERSAMPLE", "4"))  # chunks fetched per wanted patent
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "300"))
+SECTIONS = ("abstract", "claim", "description")
+
+# "PID: 123 | Claim: ..." (chunks) or "PID: 123\n\nAbstract: ..." (whole documents)
+TEXT_PREFIX = re.compile(r"^PID:[^|\n]*(?:\s*\|\s*|\n\n)\w+:\s*")
+
+
+def snippet(text: str, limit: int = SEARCH_SNIPPET_CHARS) -> str:
+    text = TEXT_PREFIX.sub("", text or "", count=1).strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def rank_patents(ids: List[str], texts: List[str], metadatas: List[Dict], distances: List[float],
+                 k: int) -> List[Dict]:
+    """
+    Collapse ranked passages to ranked patents, each with its best passage's score and snippet.
+    """
+    results, seen = [], set()
+    for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+        metadata = metadata or {}
+        pid = metadata.get("pid") or doc_id
+        if pid in seen:
+            continue
+        seen.add(pid)
+        results.append({
+            "pid": pid,
+            "score": round(distance_to_score(distance), 4),
+            "section": metadata.get("section"),
+            "snippet": snippet(text),
+        })
+        if len(results) == k:
+            break
+    return results
+
+
+def search_batch(store: "VectorStore", queries: List[str], k: int = SEARCH_DEFAULT_K,
+                 topic: Optional[str] = None, sections: Optional[List[str]] = None,
+                 embeddings=None) -> List[Dict]:
+    """
+    Top-k patents for each query text, searching only the topic's partition if
+    given and, with sections, only those chunk sections (abstract, claim, description).
+    Section chunks are searched when the chunk index is populated, whole
+    patents otherwise. Precomputed embeddings skip embedding the queries.
+    Returns [{"query", "results": [{"pid", "score", "section", "snippet"}]}] in query order.
+    Raises UnknownTopic for a topic that has not been ingested, and ValueError
+    for sections when there are no section chunks to filter.
+    """
+    if store.remote:
+        return store.search_batch(queries, k, topic, sections)
+
+    documents_target, chunks_target = store.collections(topic)
+    use_chunks = chunks_target.count() > 0
+    if sections and not use_chunks:
+        raise ValueError("Section filters need the chunk index, which is empty"
+                         + (f" for topic '{topic}'" if topic else ""))
+    target = chunks_target if use_chunks else documents_target
+    if embeddings is None:
+        with SEARCH_STAGE_SECONDS.time(stage="embedding"):
+            embeddings = store.embed(queries)
+
+    query = {"query_embeddings": np.asarray(embeddings, dtype=np.float32),
+             "n_results": k * SEARCH_OVERSAMPLE if use_chunks else k,
+             "include": ["documents", "metadatas", "distances"]}
+    if sections and use_chunks:
+        query["where"] = {"section": {"$in": list(sections)}}
+    with SEARCH_STAGE_SECONDS.time(stage="vector_search"):
+        found = target.query(**query)
+    SEARCH_QUERIES.inc(len(queries))
+
+    return [
+        {"query": text, "results": rank_patents(ids, texts, metadatas, distances, k)}
+        for text, ids, texts, metadatas, distances in zip(
+            queries, found["ids"], found["documents"], found["metadatas"], found["distances"])
+    ]
@@ -0,0 +1,109 @@
+# utils/chunker.py
+import os
+import re
+import hashlib
+from typing import List, Dict, Tuple
+
+# === CONFIGURATION ===
+CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "1200"))
+MIN_CHUNK_CHARS = 40
+
+SENTENCE_END = re.compile(r"(?<=[.;:!?])\s+")
+CLAIM_START = re.compile(r"(?:^|\s)(\d{1,3})\.\s+(?=[A-Z])")
+
+
+def split_claims(text: str) -> List[Tuple[int, str]]:
+    """
+    Split the Claims section into individual numbered claims.
+    Claim numbers must increase by one, so references like "claim 1." inside a claim
+    body do not start a new chunk. Returns (offset, claim_text) pairs.
+    """
+    starts = []
+    expected = 1
+    for match in CLAIM_START.finditer(text):
+        if int(match.group(1)) == expected:
+            starts.append(match.start(1))
+            expected += 1
+
+    if not starts:
+        return [(0, text.strip())] if text.strip() else []
+
+    claims = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        claim = text[start:end].strip()
+        if claim:
+            claims.append((start, claim))
+    return claims
+
+
+def split_paragraphs(text: str, max_chars: int = CHUNK_CHARS) -> List[Tuple[int, str]]:
+    """
+    Split free text into paragraph-sized windows on sentence boundaries.
+    The scraped description has no line breaks, so sentences are packed greedily
+    up to max_chars. Returns (offset, paragraph_text) pairs.
+    """
+    pieces = []
+    pos = 0
+    for match in SENTENCE_END.finditer(text):
+        pieces.append((pos, text[pos:match.start()]))
+        pos = match.end()
+    if pos < len(text):
+        pieces.append((pos, text[pos:]))
+
+    paragraphs = []
+    current_start, current = None, ""
+    for offset, sentence in pieces:
+        # Hard-wrap sentences that are longer than a whole chunk
+        while len(sentence) > max_chars:
+            if current:
+                paragraphs.append((current_start, current))
+                current_start, current = None, ""
+            paragraphs.append((offset, sentence[:max_chars]))
+            offset += max_chars
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            paragraphs.append((current_start, current))
+            current_start, current = None, ""
+        if current_start is None:
+            current_start, current = offset, sentence
+        else:
+            current = f"{current} {sentence}"
+    if current:
+        paragraphs.append((current_start, current))
+
+    return [(offset, p.strip()) for offset, p in paragraphs if len(p.strip()) >= MIN_CHUNK_CHARS]
+
+
+def chunk_id(pid: str, section: str, offset: int, text: str) -> str:
+    key = f"{pid}|{section}|{offset}|{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def chunk_patent(row: Dict[str, str], max_chars: int = CHUNK_CHARS) -> List[Dict]:
+    """
+    Split one parsed patent into section-tagged chunks.
+    Each chunk is a dict with id, text and metadata (pid, section, offset, chunk).
+    """
+    pid = row.get("pid", "")
+    sections = [
+        ("abstract", [(0, row.get("Abstract", "").strip())] if row.get("Abstract", "").strip() else []),
+        ("claim", split_claims(row.get("Claims", ""))),
+        ("description", split_paragraphs(row.get("Description", ""), max_chars)),
+    ]
+
+    chunks = []
+    for section, parts in sections:
+        for index, (offset, text) in enumerate(parts):
+            if section == "claim" and len(text) > max_chars:
+                # Long claims are wrapped like description paragraphs, keeping the claim offset
+                sub_parts = [(offset + o, t) for o, t in split_paragraphs(text, max_chars)]
+            else:
+                sub_parts = [(offset, text)]
+            for sub_offset, sub_text in sub_parts:
+                chunks.append({
+                    "id": chunk_id(pid, section, sub_offset, sub_text),
+                    "text": f"PID: {pid} | {section.capitalize()}: {sub_text}",
+                    "metadata": {"pid": pid, "section": section, "offset": sub_offset, "chunk": index},
+                })
+    return chunks
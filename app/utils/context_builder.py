@@ -0,0 +1,113 @@
+# utils/context_builder.py
+import os
+import re
+from typing import Dict, List, Tuple
+
+from app.utils.tokens import TOKEN_PATTERN, estimate_tokens
+
+# === CONFIGURATION ===
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+MAX_PASSAGES_PER_PATENT = int(os.getenv("MAX_PASSAGES_PER_PATENT", "3"))
+MIN_PATENTS_IN_CONTEXT = int(os.getenv("MIN_PATENTS_IN_CONTEXT", "3"))  # budget is shared at least this ways
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.8"))  # shingle Jaccard
+MIN_PASSAGE_TOKENS = 40  # don't bother trimming a passage below this
+SEPARATOR = "\n---\n"
+
+PID_PATTERN = re.compile(r"PID:\s*(\S+)")
+PREFIX_PATTERN = re.compile(r"^PID:\s*\S+\s*\|?\s*")
+
+
+def passage_pid(passage: Dict) -> str:
+    """PID from the record metadata, or the "PID: ..." header of older records."""
+    pid = (passage.get("metadata") or {}).get("pid")
+    if pid:
+        return str(pid)
+    match = PID_PATTERN.search(passage["text"])
+    return match.group(1) if match else ""
+
+
+def normalize_pid(pid: str) -> str:
+    pid = re.sub(r"[^0-9A-Za-z]", "", pid).upper()
+    return pid[2:] if pid.startswith("US") else pid
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = re.findall(r"\w+", PREFIX_PATTERN.sub("", text).lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def _is_duplicate(shingles: set, seen: List[set]) -> bool:
+    for other in seen:
+        union = len(shingles | other)
+        if union and len(shingles & other) / union >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text to roughly `budget` estimated tokens, ending at a sentence if one is close."""
+    words = 0
+    limit = int((budget - 1) / 1.3) - 5  # room for the " [...]" marker
+    for match in TOKEN_PATTERN.finditer(text):
+        words += 1
+        if words > limit:
+            cut = text[:match.start()]
+            sentence_end = cut.rfind(". ")
+            if sentence_end > len(cut) * 0.7:
+                cut = cut[:sentence_end + 1]
+            return cut.rstrip() + " [...]"
+    return text
+
+
+def pack_context(passages: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_per_patent: int = MAX_PASSAGES_PER_PATENT) -> Tuple[str, List[str], int]:
+    """
+    Pack ranked passages ({"text", "metadata"}, best first) into a token budget.
+    Duplicate and near-duplicate passages are dropped, and each patent's best
+    passage is placed before any patent's second one, so the context spans as
+    many patents as fit. A passage larger than its share of the budget (split
+    MIN_PATENTS_IN_CONTEXT ways) or than what is left is trimmed rather than skipped.
+    Returns (context, pids in the context, tokens used).
+    """
+    # Interleave: rank within the patent first, overall rank second
+    occurrence, order = {}, []
+    for rank, passage in enumerate(passages):
+        pid = passage_pid(passage)
+        occurrence[pid] = occurrence.get(pid, 0) + 1
+        if occurrence[pid] <= max_per_patent:
+            order.append((occurrence[pid], rank, pid, passage))
+    order.sort(key=lambda item: item[:2])
+    share = budget // max(1, min(len(occurrence), MIN_PATENTS_IN_CONTEXT))
+
+    packed, pids, seen, used = [], [], [], 0
+    separator_tokens = estimate_tokens(SEPARATOR)
+    for _, _, pid, passage in order:
+        remaining = budget - used - (separator_tokens if packed else 0)
+        if remaining < MIN_PASSAGE_TOKENS:
+            break
+        shingles = _shingles(passage["text"])
+        if _is_duplicate(shingles, seen):
+            continue
+
+        text = passage["text"]
+        tokens = estimate_tokens(text)
+        if tokens > min(share, remaining):
+            text = truncate_to_tokens(text, min(share, remaining))
+            tokens = estimate_tokens(text)
+        packed.append(text)
+        seen.append(shingles)
+        used += tokens + (separator_tokens if len(packed) > 1 else 0)
+        if pid and pid not in pids:
+            pids.append(pid)
+    return SEPARATOR.join(packed), pids, used
+
+
+def filter_citations(cited: List[str], context_pids: List[str]) -> List[str]:
+    """Keep only cited PIDs whose text was in the context, in the model's order."""
+    allowed = {normalize_pid(pid): pid for pid in context_pids}
+    kept = []
+    for pid in cited:
+        match = allowed.get(normalize_pid(pid))
+        if match and match not in kept:
+            kept.append(match)
+    return kept
@@ -0,0 +1,165 @@
+# utils/crawl_cache.py
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Optional
+
+from app.utils.metrics import Gauge
+
+# === CONFIGURATION ===
+CRAWL_CACHE_DIR = os.getenv(
+    "CRAWL_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "crawl_cache"))
+# off: always fetch; prefer: serve fresh cached pages, revalidate stale ones;
+# revalidate: always send a conditional request; offline: cache only, never touch the network
+CRAWL_CACHE_MODE = os.getenv("CRAWL_CACHE_MODE", "prefer")
+CRAWL_CACHE_MAX_AGE = float(os.getenv("CRAWL_CACHE_MAX_AGE", str(7 * 86400)))  # seconds
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL has never been fetched."""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class CrawlCache:
+    """
+    Compressed, content-addressed store of fetched pages.
+    Bodies are gzip files named by the hash of their content, so identical pages are
+    stored once; a small JSON record per URL points at the body and keeps the
+    validators (ETag / Last-Modified) used for conditional revalidation.
+    """
+
+    def __init__(self, cache_dir: str = CRAWL_CACHE_DIR, mode: str = CRAWL_CACHE_MODE,
+                 max_age: float = CRAWL_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(os.path.join(cache_dir, "urls"), exist_ok=True)
+            os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, "urls", f"{_sha256(url.encode('utf-8'))}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.html.gz")
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self._url_path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load_body(self, entry: Dict) -> bytes:
+        with gzip.open(self._object_path(entry["object"]), "rb") as f:
+            return f.read()
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return self.mode == "offline" or (
+            self.mode == "prefer" and time.time() - entry["fetched_at"] < self.max_age)
+
+    def conditional_headers(self, entry: Optional[Dict]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _write_entry(self, url: str, entry: Dict):
+        path = self._url_path(url)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def store(self, url: str, body: bytes, headers) -> Dict:
+        """Save a 200 response body and its validators."""
+        digest = _sha256(body)
+        obj_path = self._object_path(digest)
+        if not os.path.exists(obj_path):
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            tmp = f"{obj_path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp, "wb", compresslevel=6) as f:
+                f.write(body)
+            os.replace(tmp, obj_path)
+
+        entry = {
+            "url": url,
+            "object": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        self._write_entry(url, entry)
+        return entry
+
+    def mark_revalidated(self, url: str, entry: Dict):
+        """Record a 304 response: the cached body is still current."""
+        entry["fetched_at"] = time.time()
+        self._write_entry(url, entry)
+        with self.lock:
+            self.revalidated += 1
+
+    def count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+
+_cache = None
+Gauge("patentai_crawl_cache_requests_total", "Crawl cache hits, misses and revalidations in this process.",
+      ["stat"], kind="counter").set_function(lambda: _cache.stats() if _cache else {})
+
+
+def get_crawl_cache() -> CrawlCache:
+    global _cache
+    if _cache is None:
+        _cache = CrawlCache()
+    return _cache
+
+
+def fetch(session, url: str, timeout: float = 20) -> tuple:
+    """
+    GET a URL with a requests session through the crawl cache.
+    Returns (content, from_network).
+    """
+    cache = get_crawl_cache()
+    entry = cache.lookup(url)
+    if entry and cache.is_fresh(entry):
+        cache.count(hit=True)
+        return cache.load_body(entry), False
+    if cache.mode == "offline":
+        raise CacheMiss(f"Not in crawl cache (offline mode): {url}")
+
+    res = session.get(url, timeout=timeout, headers=cache.conditional_headers(entry))
+    if res.status_code == 304 and entry:
+        cache.mark_revalidated(url, entry)
+        cache.count(hit=True)
+        return cache.load_body(entry), True
+    res.raise_for_status()
+    cache.count(hit=False)
+    if cache.enabled:
+        cache.store(url, res.content, res.headers)
+    return res.content, True
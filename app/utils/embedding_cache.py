@@ -0,0 +1,182 @@
+# utils/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+# === CONFIGURATION ===
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "embedding_cache"))
+EMBEDDING_CACHE_CAPACITY = int(os.getenv("EMBEDDING_CACHE_CAPACITY", "100000"))  # vectors
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"  # model behind DefaultEmbeddingFunction
+
+SQL_BATCH = 500
+
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL_NAME) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding store: vectors live in a fixed-capacity memory-mapped
+    float32 array, and a SQLite index maps text hashes to array slots. When the array
+    is full, the least recently used slots are reused.
+    """
+
+    def __init__(self, cache_dir: str = EMBEDDING_CACHE_DIR, capacity: int = EMBEDDING_CACHE_CAPACITY):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.capacity = capacity
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.lock = threading.Lock()
+        self.vectors: Optional[np.memmap] = None
+
+        self.db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row:
+            self._open(int(row[0]))
+
+    def _open(self, dim: int):
+        expected = self.capacity * dim * 4
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != expected:
+            # Capacity or model changed: start over rather than misread slots
+            print(f"⚠️ Embedding cache layout changed, resetting {self.vectors_path}")
+            self.db.execute("DELETE FROM entries")
+            os.remove(self.vectors_path)
+        mode = "r+" if os.path.exists(self.vectors_path) else "w+"
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+        self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(dim),))
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the keys that are present, marking them recently used."""
+        if self.vectors is None or not keys:
+            return {}
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self.db.execute(f"SELECT key, slot FROM entries WHERE key IN ({marks})", batch).fetchall()
+                for key, slot in rows:
+                    found[key] = np.array(self.vectors[slot])
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Store vectors, evicting least recently used entries when the array is full."""
+        if not items:
+            return
+        with self.lock:
+            if self.vectors is None:
+                self._open(len(next(iter(items.values()))))
+
+            now = time.time()
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(items)
+                present = set()
+                for start in range(0, len(keys), SQL_BATCH):
+                    batch = keys[start:start + SQL_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    present.update(k for (k,) in self.db.execute(
+                        f"SELECT key FROM entries WHERE key IN ({marks})", batch).fetchall())
+                new_keys = [k for k in items if k not in present][:self.capacity]
+
+                used = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                free = list(range(used, min(self.capacity, used + len(new_keys))))
+                shortfall = len(new_keys) - len(free)
+                if shortfall > 0:
+                    evicted = self.db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (shortfall,)).fetchall()
+                    self.db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in evicted])
+                    free.extend(slot for _, slot in evicted)
+
+                for key, slot in zip(new_keys, free):
+                    self.vectors[slot] = np.asarray(items[key], dtype=np.float32)
+                self.db.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    [(key, slot, now) for key, slot in zip(new_keys, free)])
+                self.vectors.flush()
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Wraps an embedding function so identical texts are only ever embedded once."""
+
+    def __init__(self, inner: Optional[EmbeddingFunction] = None, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner if inner is not None else DefaultEmbeddingFunction()
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, input: Documents) -> Embeddings:
+        keys = [cache_key(text) for text in input]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.hits += len(keys) - sum(1 for k in keys if k in missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.inner(list(missing.values()))
+            fresh = {key: np.asarray(vec, dtype=np.float32) for key, vec in zip(missing, computed)}
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
+
+    # Same model as DefaultEmbeddingFunction, so collections created with it stay compatible
+    @staticmethod
+    def name() -> str:
+        return "default"
+
+    def get_config(self) -> Dict:
+        return {}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "CachedEmbeddingFunction":
+        return get_embedding_function()
+
+
+_embedding_fn = None
+_embedding_fn_lock = threading.Lock()
+
+
+def get_embedding_function() -> EmbeddingFunction:
+    """Process-wide embedding function, cached unless EMBEDDING_CACHE_ENABLED=false."""
+    global _embedding_fn
+    with _embedding_fn_lock:
+        if _embedding_fn is None:
+            if EMBEDDING_CACHE_ENABLED:
+                _embedding_fn = CachedEmbeddingFunction()
+                print(f"🗃️ Embedding cache at {EMBEDDING_CACHE_DIR} ({len(_embedding_fn.cache)} vectors)")
+            else:
+                _embedding_fn = DefaultEmbeddingFunction()
+    return _embedding_fn
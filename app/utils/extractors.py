@@ -0,0 +1,130 @@
+# utils/extractors.py
+import os
+import threading
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+from bs4.dammit import UnicodeDammit
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the pure-Python parser
+    etree = None
+
+# === CONFIGURATION ===
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "auto")  # "auto", "lxml" or "bs4"
+SECTIONS = ("Abstract", "Claims", "Description")
+
+
+class BeautifulSoupExtractor:
+    """Reference extractor: BeautifulSoup with the pure-Python html.parser."""
+
+    name = "bs4"
+
+    def extract_sections(self, html) -> Dict[str, str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        data = {}
+        for block in soup.find_all('div', class_='disp_doc2'):
+            title_div = block.find('div', class_='disp_elm_title')
+            text_div = block.find('div', class_='disp_elm_text')
+            if not title_div or not text_div:
+                continue
+
+            section = title_div.get_text(strip=True).strip(':')
+            content = text_div.get_text(separator=' ', strip=True)
+
+            # Only keep relevant patent sections
+            if section in SECTIONS:
+                data[section] = content
+        return data
+
+    def extract_patent_ids(self, html) -> List[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        td_list = soup.find_all('td', attrs={'width': '15%', 'valign': 'top'})
+        return [td.get_text(strip=True) for td in td_list if td.get_text(strip=True)]
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlExtractor:
+    """
+    C-backed extractor on libxml2. XPath selects only the section blocks and
+    their title/text nodes, and text is joined the same way as BeautifulSoup's
+    get_text(separator, strip=True), so output matches BeautifulSoupExtractor.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        # libxml2 parsers and compiled XPath are not safe to share across threads
+        self.local = threading.local()
+
+    def _compiled(self):
+        local = self.local
+        if not hasattr(local, "parser"):
+            local.parser = etree.HTMLParser()
+            local.blocks = etree.XPath(f"//div[{_has_class('disp_doc2')}]")
+            local.title = etree.XPath(f"(.//div[{_has_class('disp_elm_title')}])[1]")
+            local.text = etree.XPath(f"(.//div[{_has_class('disp_elm_text')}])[1]")
+            local.ids = etree.XPath("//td[@width='15%' and @valign='top']")
+            local.strings = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+        return local
+
+    def _parse(self, html):
+        if isinstance(html, bytes):
+            # Decode like BeautifulSoup does (BOM, declared charset, then sniffing)
+            html = UnicodeDammit(html, is_html=True).unicode_markup
+        try:
+            return etree.fromstring(html, self._compiled().parser)
+        except (etree.XMLSyntaxError, ValueError):
+            return None
+
+    def _text(self, node, separator: str) -> str:
+        strings = self._compiled().strings(node)
+        return separator.join(s for s in (t.strip() for t in strings) if s)
+
+    def extract_sections(self, html) -> Dict[str, str]:
+        root = self._parse(html)
+        data = {}
+        if root is None:
+            return data
+        xpath = self._compiled()
+        for block in xpath.blocks(root):
+            title_div = xpath.title(block)
+            text_div = xpath.text(block)
+            if not title_div or not text_div:
+                continue
+
+            section = self._text(title_div[0], "").strip(':')
+            if section in SECTIONS:
+                data[section] = self._text(text_div[0], " ")
+        return data
+
+    def extract_patent_ids(self, html) -> List[str]:
+        root = self._parse(html)
+        if root is None:
+            return []
+        ids = (self._text(td, "") for td in self._compiled().ids(root))
+        return [pid for pid in ids if pid]
+
+
+EXTRACTORS = {"bs4": BeautifulSoupExtractor, "lxml": LxmlExtractor}
+_extractor = None
+
+
+def get_extractor(name: str = None):
+    """Return the configured extractor; "auto" prefers lxml when it is installed."""
+    global _extractor
+    if name is not None:
+        if name == "lxml" and etree is None:
+            raise ImportError("HTML_EXTRACTOR=lxml requires the lxml package")
+        return EXTRACTORS[name]()
+    if _extractor is None:
+        choice = HTML_EXTRACTOR
+        if choice == "auto":
+            choice = "lxml" if etree is not None else "bs4"
+        _extractor = get_extractor(choice)
+        print(f"🧩 Using HTML extractor: {_extractor.name}")
+    return _extractor
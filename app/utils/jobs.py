@@ -0,0 +1,153 @@
+# utils/jobs.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from uuid import uuid4
+from typing import Dict, Optional, Tuple
+
+from app.utils.tracing import log_event
+
+# === CONFIGURATION ===
+JOB_TTL = int(os.getenv("JOB_TTL", "86400"))  # keep finished job status for a day
+JOB_LOCK_TTL = int(os.getenv("JOB_LOCK_TTL", "30"))  # a topic is freed this long after its job stops renewing the claim
+JOB_LOCK_REFRESH = JOB_LOCK_TTL / 3  # how often a running job renews it
+JOB_FLUSH_INTERVAL = float(os.getenv("JOB_FLUSH_INTERVAL", "0.5"))
+
+JOB_KEY = "job:{}"
+TOPIC_JOB_KEY = "topic_job:{}"
+
+# Strong references to running jobs so they are not garbage-collected mid-flight
+_running_tasks = set()
+
+
+class JobProgress:
+    """
+    Progress counters for one job, safe to update from worker threads.
+    The job's flusher coroutine writes changed counters to Redis periodically.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fields: Dict[str, str] = {}
+        self.dirty = False
+
+    def update(self, **fields):
+        with self.lock:
+            self.fields.update({k: str(v) for k, v in fields.items()})
+            self.dirty = True
+
+    def drain(self) -> Dict[str, str]:
+        with self.lock:
+            if not self.dirty:
+                return {}
+            self.dirty = False
+            return dict(self.fields)
+
+
+async def get_job(redis_client, job_id: str) -> Optional[Dict[str, str]]:
+    job = await redis_client.hgetall(JOB_KEY.format(job_id))
+    return job or None
+
+
+async def get_topic_job(redis_client, topic: str) -> Optional[str]:
+    """Return the ID of the job currently running for a topic, if any."""
+    return await redis_client.get(TOPIC_JOB_KEY.format(topic))
+
+
+async def _set_job(redis_client, job: str, **fields):
+    fields["updated_at"] = f"{time.time():.3f}"
+    key = JOB_KEY.format(job)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping={k: str(v) for k, v in fields.items()})
+        pipe.expire(key, JOB_TTL)
+        await pipe.execute()
+
+
+async def _flush_progress(redis_client, job_id: str, progress: JobProgress, stop: asyncio.Event):
+    while True:
+        fields = progress.drain()
+        if fields:
+            await _set_job(redis_client, job_id, **fields)
+        if stop.is_set():
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOB_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _hold_lock(redis_client, lock_key: str, job_id: str, stop: asyncio.Event):
+    """Renew the job's claim on its topic until it finishes, so a crashed worker frees the topic quickly."""
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOB_LOCK_REFRESH)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            if await redis_client.get(lock_key) != job_id:
+                print(f"⚠️ Job {job_id} lost its claim on {lock_key}")
+                return
+            await redis_client.expire(lock_key, JOB_LOCK_TTL)
+        except Exception as e:
+            print(f"⚠️ Could not renew {lock_key}: {e}; retrying")
+
+
+async def submit_job(redis_client, topic: str, user: str, runner) -> Tuple[str, bool]:
+    """
+    Start `runner(progress)` as a background job for a topic, or attach to the job
+    already running for it. Returns (job_id, attached).
+    """
+    job_id = str(uuid4())
+    lock_key = TOPIC_JOB_KEY.format(topic)
+    if not await redis_client.set(lock_key, job_id, nx=True, ex=JOB_LOCK_TTL):
+        existing = await redis_client.get(lock_key)
+        if existing:
+            return existing, True
+        # Lock expired between SET and GET; claim it now
+        await redis_client.set(lock_key, job_id, ex=JOB_LOCK_TTL)
+
+    now = f"{time.time():.3f}"
+    await _set_job(
+        redis_client, job_id,
+        job_id=job_id, topic=topic, user=user, status="queued", message="",
+        pages_fetched=0, patents_parsed=0, documents_embedded=0, created_at=now,
+    )
+
+    task = asyncio.create_task(_run_job(redis_client, job_id, topic, runner))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return job_id, False
+
+
+async def _run_job(redis_client, job_id: str, topic: str, runner):
+    progress = JobProgress()
+    stop = asyncio.Event()
+    lock_key = TOPIC_JOB_KEY.format(topic)
+    flusher = asyncio.create_task(_flush_progress(redis_client, job_id, progress, stop))
+    heartbeat = asyncio.create_task(_hold_lock(redis_client, lock_key, job_id, stop))
+    # Runs in the context of the request that submitted it, so events carry its trace ID
+    started = time.perf_counter()
+    log_event("job_started", job_id=job_id, topic=topic)
+    try:
+        await _set_job(redis_client, job_id, status="running")
+        message = await runner(progress)
+        stop.set()
+        await flusher
+        await _set_job(redis_client, job_id, status="done", message=message)
+        log_event("job_finished", job_id=job_id, topic=topic, message=message,
+                  duration_s=round(time.perf_counter() - started, 2))
+    except Exception as e:
+        stop.set()
+        await flusher
+        await _set_job(redis_client, job_id, status="failed", message=str(e))
+        log_event("job_failed", logging.ERROR, job_id=job_id, topic=topic, error=str(e),
+                  duration_s=round(time.perf_counter() - started, 2))
+    finally:
+        stop.set()
+        await heartbeat
+        # Release the topic only if this job still owns it
+        if await redis_client.get(lock_key) == job_id:
+            await redis_client.delete(lock_key)
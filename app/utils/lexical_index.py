@@ -0,0 +1,160 @@
+# utils/lexical_index.py
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# === CONFIGURATION ===
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR", os.path.join(os.path.dirname(__file__), "..", "lexical_index"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+SYNC_PAGE = 500
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were which with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase words and digit runs. Thousands separators are dropped first so
+    "9,266,663" and "US9266663" both yield the patent number "9266663".
+    """
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())
+    return [t for t in re.findall(r"[a-z]+|\d+", text) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index in SQLite, one namespace per Chroma collection so the
+    same record IDs can be fused with vector results. Records are indexed once
+    by ID, which makes adding a topic an incremental update.
+    """
+
+    def __init__(self, index_dir: str = LEXICAL_INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            os.path.join(index_dir, "bm25.sqlite3"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "kind TEXT NOT NULL, doc_id TEXT NOT NULL, length INTEGER NOT NULL, PRIMARY KEY (kind, doc_id))")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "kind TEXT NOT NULL, term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (kind, term, doc_id)) WITHOUT ROWID")
+
+    def count(self, kind: str) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM docs WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def add(self, kind: str, records: List[Dict]) -> int:
+        """Index records ({"id", "text"}) not seen before. Returns the number added."""
+        if not records:
+            return 0
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [record["id"] for record in records]
+                marks = ",".join("?" * len(ids))
+                present = {doc_id for (doc_id,) in self.db.execute(
+                    f"SELECT doc_id FROM docs WHERE kind = ? AND doc_id IN ({marks})", [kind, *ids])}
+
+                added = 0
+                for record in records:
+                    if record["id"] in present:
+                        continue
+                    present.add(record["id"])
+                    terms = Counter(tokenize(record["text"]))
+                    self.db.execute("INSERT INTO docs (kind, doc_id, length) VALUES (?, ?, ?)",
+                                    (kind, record["id"], sum(terms.values())))
+                    self.db.executemany("INSERT INTO postings (kind, term, doc_id, tf) VALUES (?, ?, ?, ?)",
+                                        [(kind, term, record["id"], tf) for term, tf in terms.items()])
+                    added += 1
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return added
+
+    def remove(self, kind: str, ids: List[str]):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany("DELETE FROM postings WHERE kind = ? AND doc_id = ?", [(kind, i) for i in ids])
+                self.db.executemany("DELETE FROM docs WHERE kind = ? AND doc_id = ?", [(kind, i) for i in ids])
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def drop(self, kind: str):
+        with self.lock:
+            self.db.execute("DELETE FROM postings WHERE kind = ?", (kind,))
+            self.db.execute("DELETE FROM docs WHERE kind = ?", (kind,))
+
+    def search(self, kind: str, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (doc_id, BM25 score) pairs, best first."""
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        with self.lock:
+            n_docs, total_length = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE kind = ?", (kind,)).fetchone()
+            if not n_docs:
+                return []
+            avg_length = total_length / n_docs
+
+            scores = Counter()
+            for term in terms:
+                postings = self.db.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p "
+                    "JOIN docs d ON d.kind = p.kind AND d.doc_id = p.doc_id "
+                    "WHERE p.kind = ? AND p.term = ?", (kind, term)).fetchall()
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def sync(self, collection) -> int:
+        """Index any records of a Chroma collection that are missing (e.g. a DB built before this index)."""
+        total = collection.count()
+        if self.count(collection.name) >= total:
+            return 0
+        added = 0
+        for offset in range(0, total, SYNC_PAGE):
+            page = collection.get(include=["documents"], limit=SYNC_PAGE, offset=offset)
+            added += self.add(collection.name, [
+                {"id": doc_id, "text": text or ""} for doc_id, text in zip(page["ids"], page["documents"])])
+        if added:
+            print(f"🔤 Indexed {added} existing records of '{collection.name}' for BM25")
+        return added
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked ID lists: each list contributes 1 / (k + rank) per ID. Returns (id, score), best first."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return scores.most_common()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex()
+    return _index
@@ -0,0 +1,139 @@
+# utils/llm_backends.py
+import os
+import re
+import json
+import asyncio
+import hashlib
+from xml.sax.saxutils import escape
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+# === CONFIGURATION ===
+LLM_BACKEND = os.getenv("LLM_BACKEND", "huggingface")  # "huggingface" or "stub"
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.5"))  # seconds per completion
+MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistralai/Mistral-7B-Instruct-v0.3")
+
+
+class HuggingFaceBackend:
+    """Chat completions from the Hugging Face Inference API (the production backend)."""
+
+    name = "huggingface"
+
+    def __init__(self, model: str = MISTRAL_MODEL, token: str = None, timeout: float = None):
+        self.model = model
+        self.token = token
+        self.timeout = timeout
+        self.client = None
+
+    def _client(self):
+        # Created on first use, so the app starts without a token; read then, after .env is loaded
+        if self.client is None:
+            token = self.token or os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACEHUB_API_TOKEN")
+            if not token:
+                raise EnvironmentError("Please set HF_TOKEN or HUGGINGFACEHUB_API_TOKEN")
+            from huggingface_hub import AsyncInferenceClient
+            self.client = AsyncInferenceClient(model=self.model, api_key=token, timeout=self.timeout)
+        return self.client
+
+    async def complete(self, messages: List[Dict], max_tokens: int = 512, temperature: float = 0.0) -> str:
+        response = await self._client().chat_completion(
+            messages=messages, max_tokens=max_tokens, temperature=temperature)
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[Dict], max_tokens: int = 512,
+                     temperature: float = 0.0) -> AsyncIterator[str]:
+        response = await self._client().chat_completion(
+            messages=messages, max_tokens=max_tokens, temperature=temperature, stream=True)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubBackend:
+    """
+    Deterministic local stand-in for load tests and offline runs. After a fixed
+    latency it answers in the expected <response> format, citing the first
+    patents found in the prompt context. Streamed, the same latency is spread
+    evenly over the completion's chunks.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = LLM_STUB_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    async def complete(self, messages: List[Dict], max_tokens: int = 512, temperature: float = 0.0) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.render(messages)
+
+    async def stream(self, messages: List[Dict], max_tokens: int = 512,
+                     temperature: float = 0.0) -> AsyncIterator[str]:
+        self.calls += 1
+        chunks = re.findall(r"\S*\s*", self.render(messages))[:-1]
+        for chunk in chunks:
+            await asyncio.sleep(self.latency / len(chunks))
+            yield chunk
+
+    def render(self, messages: List[Dict]) -> str:
+        prompt = messages[-1]["content"]
+        question = prompt.rsplit("User question:", 1)[-1].strip()
+        pids = list(dict.fromkeys(re.findall(r"PID:\s*(\S+)", prompt)))[:2]
+        answer = escape(f"Stub answer to: {question}")
+        return (
+            "<response>\n"
+            f"    <answer>{answer}</answer>\n"
+            "    <patents>\n"
+            + "".join(f"        <pid>{pid}</pid>\n" for pid in pids)
+            + "    </patents>\n"
+            "</response>"
+        )
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: the first caller for a key starts the
+    call and later callers await the same result. A caller that times out or is
+    cancelled does not cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self.inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self.inflight)}
+
+
+def prompt_key(messages: List[Dict], **params) -> str:
+    return hashlib.sha256(json.dumps([messages, params], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# A backend has a `name`, `async complete(messages, max_tokens, temperature) -> str`
+# and `stream(messages, max_tokens, temperature)`, an async iterator of text chunks
+BACKENDS = {"huggingface": HuggingFaceBackend, "stub": StubBackend}
+_backend = None
+
+
+def get_llm_backend(name: str = None, **kwargs):
+    """Return the configured backend; a name builds a fresh instance of that backend."""
+    global _backend
+    if name is not None:
+        return BACKENDS[name](**kwargs)
+    if _backend is None:
+        _backend = BACKENDS[LLM_BACKEND](**kwargs)
+        print(f"🤖 Using LLM backend: {_backend.name}")
+    return _backend
@@ -0,0 +1,226 @@
+# utils/metrics.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import redis.asyncio as redis
+from pymongo import monitoring
+
+# Seconds; spans a cached Redis GET up to a slow LLM completion
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    Point-in-time value. With `set_function`, the value is read at scrape time
+    from a callable returning a number or, for a labelled gauge, a dict of
+    {label value: number}; this exports counters other modules already keep.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.values: Dict[Tuple, float] = {}
+        self.function: Callable = None
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, function: Callable):
+        self.function = function
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            value = self.function()
+            items = [((str(k),), v) for k, v in value.items()] if isinstance(value, dict) else [((), value)]
+        else:
+            with self.lock:
+                items = list(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {float(value)}" for key, value in sorted(items)]
+
+
+class Histogram(_Metric):
+    """Latency distribution per label combination, in cumulative Prometheus buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple, List] = {}  # key -> [bucket counts (last is +Inf), sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Every registered metric of this process in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# === SHARED METRICS ===
+CHAT_STAGE_SECONDS = Histogram(
+    "patentai_chat_stage_seconds", "Time spent in each stage of answering a chat question.", ["stage"])
+LLM_REQUESTS = Counter(
+    "patentai_llm_requests_total", "LLM completions by backend and outcome.", ["backend", "outcome"])
+SEARCH_STAGE_SECONDS = Histogram(
+    "patentai_search_stage_seconds", "Time per stage of a batched /api/search request.", ["stage"])
+SEARCH_QUERIES = Counter("patentai_search_queries_total", "Query texts answered by /api/search.")
+CRAWL_SECONDS = Histogram(
+    "patentai_crawl_seconds", "Time to fetch a crawled page or parse it.", ["stage"])
+CRAWL_FAILURES = Counter(
+    "patentai_crawl_failures_total", "Result or patent pages that could not be fetched or parsed.", ["page"])
+INGEST_BATCH_SECONDS = Histogram(
+    "patentai_ingest_batch_seconds", "Time to ingest one batch of patent rows into the vector store.")
+INGEST_STAGE_SECONDS = Histogram(
+    "patentai_ingest_stage_seconds", "Time spent per ingestion step, per upserted record batch.", ["stage"])
+INGEST_DOCUMENTS = Counter(
+    "patentai_ingest_documents_total", "Patents offered for ingestion, new or already stored.", ["outcome"])
+REDIS_SECONDS = Histogram(
+    "patentai_redis_command_seconds", "Redis round trips by command (PIPELINE for pipelines).", ["command"])
+REDIS_FAILURES = Counter(
+    "patentai_redis_command_failures_total", "Redis round trips that raised.", ["command"])
+MONGO_SECONDS = Histogram(
+    "patentai_mongo_command_seconds", "MongoDB commands by name.", ["command"])
+MONGO_FAILURES = Counter(
+    "patentai_mongo_command_failures_total", "MongoDB commands that failed.", ["command"])
+
+
+# === DATABASE INSTRUMENTATION ===
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command; pass as AsyncIOMotorClient(event_listeners=[...])."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGO_FAILURES.inc(command=event.command_name)
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            REDIS_FAILURES.inc(command="PIPELINE")
+            raise
+        finally:
+            REDIS_SECONDS.observe(time.perf_counter() - start, command="PIPELINE")
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that times each command and pipeline round trip."""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper() if args else ""
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_FAILURES.inc(command=command)
+            raise
+        finally:
+            REDIS_SECONDS.observe(time.perf_counter() - start, command=command)
+
+    def pipeline(self, transaction: bool = True, shard_hint: str = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
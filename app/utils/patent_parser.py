@@ -1,10 +1,13 @@
 # utils/patent_parser.py
 import os
 import time
-import csv
+import json
 import random
 import requests
-from bs4 import BeautifulSoup
+
+from app.utils import crawl_cache, patent_store
+from app.utils.extractors import get_extractor
+from app.utils.metrics import CRAWL_FAILURES, CRAWL_SECONDS
 
 USER_AGENTS = [
     # 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
@@ -14,8 +17,7 @@ USER_AGENTS = [
 ]
 
 
-BASE_URL = "https://www.freepatentsonline.com"
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "parsed_patents")
+BASE_URL = os.getenv("PATENT_BASE_URL", "https://www.freepatentsonline.com")
 MAX_DOCS = 50
 DELAY_BETWEEN_PATENTS = 1.5
 MAX_FAILURES = 5
@@ -28,68 +30,148 @@ def new_session():
     })
     return sess
 
-def parse_patent(url, pid, session):
-    try:
-        print(f"🔎 Fetching patent {pid} from URL: {url}")
-        res = session.get(url, timeout=20)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.content, 'html.parser')
-        data = {'pid': pid}
-
-        for block in soup.find_all('div', class_='disp_doc2'):
-            title_div = block.find('div', class_='disp_elm_title')
-            text_div = block.find('div', class_='disp_elm_text')
-            if not title_div or not text_div:
-                continue
+def result_page_url(query, page):
+    return f"{BASE_URL}/result.html?p={page}&sort=relevance&srch=top&query_txt={query}&submit=&patents_us=on"
+
+
+def patent_url(pid):
+    """Map a result-page ID to its patent page URL and the PID stored in the CSV."""
+    if pid.startswith("US"):
+        return f"{BASE_URL}/{pid[2:6]}/{pid[6:]}.html", pid[2:]
+    return f"{BASE_URL}/{pid}.html", pid
+
+
+def extract_patent(html, pid):
+    """Pull the Abstract/Claims/Description sections out of a patent page."""
+    data = {'pid': pid}
+    data.update(get_extractor().extract_sections(html))
+
+    if not {"Abstract", "Claims", "Description"} & data.keys():
+        print(f"⚠️ No core sections found for {pid}, skipping.")
+        return None
 
-            section = title_div.get_text(strip=True).strip(':')
-            content = text_div.get_text(separator=' ', strip=True)
+    return data
 
-            # Only keep relevant patent sections
-            if section in {"Abstract", "Claims", "Description"}:
-                data[section] = content
 
-        if not {"Abstract", "Claims", "Description"} & data.keys():
-            print(f"⚠️ No core sections found for {pid}, skipping.")
-            return None
+def extract_patent_ids(html):
+    """Pull the patent IDs out of a search result page."""
+    return get_extractor().extract_patent_ids(html)
 
-        return data
+
+def parse_patent(url, pid, session):
+    """
+    Fetch and extract one patent page through the crawl cache.
+    Only network fetches are followed by the polite delay; cache hits return at once.
+    """
+    try:
+        print(f"🔎 Fetching patent {pid} from URL: {url}")
+        with CRAWL_SECONDS.time(stage="fetch"):
+            content, from_network = crawl_cache.fetch(session, url, timeout=20)
+        if from_network:
+            time.sleep(DELAY_BETWEEN_PATENTS)
+        with CRAWL_SECONDS.time(stage="parse"):
+            return extract_patent(content, pid)
 
     except Exception as e:
         print(f"❌ Failed to parse patent {pid}: {e}")
+        CRAWL_FAILURES.inc(page="patent")
         return None
 
 
 def get_patent_ids(query, page, session):
-    url = f"{BASE_URL}/result.html?p={page}&sort=relevance&srch=top&query_txt={query}&submit=&patents_us=on"
+    url = result_page_url(query, page)
     try:
         print(f"📄 Fetching patent ID list for topic '{query}', page {page}...")
-        res = session.get(url, timeout=20)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.content, 'html.parser')
-        td_list = soup.find_all('td', attrs={'width': '15%', 'valign': 'top'})
-        ids = [td.get_text(strip=True) for td in td_list if td.get_text(strip=True)]
+        with CRAWL_SECONDS.time(stage="fetch"):
+            content, _ = crawl_cache.fetch(session, url, timeout=20)
+        with CRAWL_SECONDS.time(stage="parse"):
+            ids = extract_patent_ids(content)
         print(f"✅ Found {len(ids)} patent IDs on page {page}")
         return ids
     except Exception as e:
         print(f"⚠️ Failed to fetch patent IDs on page {page}: {e}")
+        CRAWL_FAILURES.inc(page="results")
         return []
 
-def parse_and_save_topic(query: str) -> str:
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    filename = os.path.join(OUTPUT_DIR, f"{query}_50patents.csv")
-    if os.path.exists(filename):
-        print(f"📂 File already exists: {filename}")
-        return filename  # Already parsed
+
+class TopicOutput:
+    """
+    Streams parsed patents for a topic into its patent store partition, one row at
+    a time, next to a JSON checkpoint of the current result page, the result IDs
+    already written and the column offsets of the last complete row. A restarted
+    crawl rolls back any half-written row and resumes from the checkpoint; the
+    partition is marked complete only when the crawl finishes.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.checkpoint_path = os.path.join(patent_store.partition_dir(query), "_checkpoint.json")
+        self.page = 1
+        self.done = set()
+        offsets = None
+
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            self.page = checkpoint["page"]
+            self.done = set(checkpoint["done"])
+            offsets = checkpoint["offsets"]
+            print(f"♻️ Resuming crawl at page {self.page} with {offsets['_rows']} patents already saved")
+
+        self.writer = patent_store.PatentStoreWriter(query, offsets)
+        self._commit()
+
+    @property
+    def count(self) -> int:
+        return self.writer.rows
+
+    def _commit(self):
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "page": self.page,
+                "done": sorted(self.done),
+                "offsets": self.writer.offsets(sync=True),
+            }, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def set_page(self, page: int):
+        self.page = page
+        self._commit()
+
+    def append(self, result_id: str, row: dict):
+        self.writer.append(row)
+        self.done.add(result_id)
+        self._commit()
+
+    def finish(self) -> str:
+        self.writer.close(complete=bool(self.count))
+        os.remove(self.checkpoint_path)
+        if self.count:
+            print(f"💾 Saved {self.count} patents to store: {self.writer.path}")
+        else:
+            patent_store.drop_topic(self.query)
+            print("⚠️ No patents were successfully parsed.")
+        return self.writer.path
+
+
+def parse_and_save_topic(query: str, progress=None) -> str:
+    """Crawl a topic into its patent store partition and return the partition path."""
+    if patent_store.is_complete(query):
+        print(f"📂 Topic already in store: {query}")
+        return patent_store.partition_dir(query)  # Already parsed
 
     print(f"🚀 Starting parsing for topic: {query}")
-    parsed_docs = []
+    output = TopicOutput(query)
     session = new_session()
-    page = 1
+    page = output.page
     failures = 0
+    pages_fetched = 0
 
-    while len(parsed_docs) < MAX_DOCS and failures < MAX_FAILURES:
+    while output.count < MAX_DOCS and failures < MAX_FAILURES:
+        output.set_page(page)
         ids = get_patent_ids(query, page, session)
+        pages_fetched += 1
         if not ids:
             failures += 1
             print(f"❌ No IDs found on page {page}. Consecutive failures: {failures}")
@@ -97,34 +179,19 @@ def parse_and_save_topic(query: str) -> str:
             continue
 
         for pid in ids:
-            print(f"parsing {pid}....")
-            if len(parsed_docs) >= MAX_DOCS:
+            if output.count >= MAX_DOCS:
                 break
-            if pid.startswith("US"):
-                url = f"{BASE_URL}/{pid[2:6]}/{pid[6:]}.html"
-                real_pid = pid[2:]
-            else:
-                url = f"{BASE_URL}/{pid}.html"
-                real_pid = pid
+            if pid in output.done:
+                continue
+            print(f"parsing {pid}....")
+            url, real_pid = patent_url(pid)
             parsed = parse_patent(url, real_pid, session)
+            pages_fetched += 1
             if parsed:
-                parsed_docs.append(parsed)
-                print(f"✅ Parsed {real_pid}. Total parsed: {len(parsed_docs)} / {MAX_DOCS}")
-            time.sleep(DELAY_BETWEEN_PATENTS)
+                output.append(pid, parsed)
+                print(f"✅ Parsed {real_pid}. Total parsed: {output.count} / {MAX_DOCS}")
+            if progress:
+                progress(pages_fetched=pages_fetched, patents_parsed=output.count)
         page += 1
 
-    if parsed_docs:
-        print(f"💾 Saving {len(parsed_docs)} patents to CSV: {filename}")
-        with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=sorted(set().union(*(d.keys() for d in parsed_docs))),
-                quoting=csv.QUOTE_ALL
-            )
-            writer.writeheader()
-            for row in parsed_docs:
-                writer.writerow(row)
-    else:
-        print("⚠️ No patents were successfully parsed.")
-
-    return filename
+    return output.finish()
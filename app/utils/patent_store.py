@@ -0,0 +1,141 @@
+# utils/patent_store.py
+import os
+import csv
+import sys
+import json
+import shutil
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional
+
+# Fix field size limit for large patent data (Windows-safe)
+csv.field_size_limit(10_000_000)
+
+# === CONFIGURATION ===
+STORE_DIR = os.getenv("PATENT_STORE_DIR", os.path.join(os.path.dirname(__file__), "..", "patent_store"))
+PARSED_DIR = os.path.join(os.path.dirname(__file__), "..", "parsed_patents")
+COLUMNS = ["pid", "Abstract", "Claims", "Description"]
+META_FILE = "_meta.json"
+
+
+def partition_dir(topic: str) -> str:
+    return os.path.join(STORE_DIR, topic)
+
+
+def read_meta(topic: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(partition_dir(topic), META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def is_complete(topic: str) -> bool:
+    meta = read_meta(topic)
+    return bool(meta and meta.get("complete"))
+
+
+def list_topics() -> List[str]:
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(t for t in os.listdir(STORE_DIR) if is_complete(t))
+
+
+class PatentStoreWriter:
+    """
+    Appends patents to a topic partition: one line-delimited JSON file per column,
+    so readers can load `pid` and `Abstract` without touching the large
+    `Description` file. Rows are written to every column file in step, and
+    byte offsets let a crashed writer roll back to its last committed row.
+    """
+
+    def __init__(self, topic: str, offsets: Optional[Dict[str, int]] = None):
+        self.topic = topic
+        self.path = partition_dir(topic)
+        os.makedirs(self.path, exist_ok=True)
+        self.rows = 0
+        self.files = {}
+        for column in COLUMNS:
+            f = open(os.path.join(self.path, f"{column}.jsonl"), "a+b")
+            f.truncate((offsets or {}).get(column, 0))
+            f.seek(0, os.SEEK_END)
+            self.files[column] = f
+        if offsets:
+            self.rows = offsets.get("_rows", 0)
+        self._write_meta(complete=False)
+
+    def _write_meta(self, complete: bool):
+        tmp = os.path.join(self.path, f"{META_FILE}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"topic": self.topic, "columns": COLUMNS, "rows": self.rows, "complete": complete}, f)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    def append(self, row: Dict[str, str]):
+        for column, f in self.files.items():
+            f.write(json.dumps(row.get(column, ""), ensure_ascii=False).encode("utf-8") + b"\n")
+        self.rows += 1
+
+    def offsets(self, sync: bool = False) -> Dict[str, int]:
+        """Flush (optionally fsync) every column and return the committed offsets."""
+        offsets = {"_rows": self.rows}
+        for column, f in self.files.items():
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+            offsets[column] = f.tell()
+        return offsets
+
+    def close(self, complete: bool = True):
+        self.offsets(sync=True)
+        for f in self.files.values():
+            f.close()
+        self._write_meta(complete=complete)
+
+
+def read_columns(topic: str, columns: List[str] = None) -> Iterator[Dict[str, str]]:
+    """Stream rows of a partition, opening only the requested column files."""
+    columns = columns or COLUMNS
+    rows = (read_meta(topic) or {}).get("rows", 0)
+    with ExitStack() as stack:
+        files = {c: stack.enter_context(open(os.path.join(partition_dir(topic), f"{c}.jsonl"), "rb"))
+                 for c in columns}
+        for _ in range(rows):
+            yield {c: json.loads(f.readline()) for c, f in files.items()}
+
+
+def drop_topic(topic: str):
+    shutil.rmtree(partition_dir(topic), ignore_errors=True)
+
+
+def convert_csv(csv_path: str, topic: Optional[str] = None) -> str:
+    """Convert a parsed `{topic}_50patents.csv` into a store partition, row by row."""
+    if topic is None:
+        topic = os.path.basename(csv_path).replace("_50patents.csv", "")
+    drop_topic(topic)
+    writer = PatentStoreWriter(topic)
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            writer.append(row)
+    writer.close()
+    print(f"📦 Converted {writer.rows} patents from {csv_path} into {writer.path}")
+    return writer.path
+
+
+def export_csv(topic: str, csv_path: str):
+    """Write a partition back out in the original CSV layout."""
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=sorted(COLUMNS), quoting=csv.QUOTE_ALL)
+        writer.writeheader()
+        for row in read_columns(topic):
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    # python -m app.utils.patent_store convert [file.csv ...]  (default: every CSV in parsed_patents)
+    if len(sys.argv) < 2 or sys.argv[1] != "convert":
+        print("Usage: python -m app.utils.patent_store convert [file.csv ...]")
+        sys.exit(1)
+    paths = sys.argv[2:] or [
+        os.path.join(PARSED_DIR, name) for name in sorted(os.listdir(PARSED_DIR)) if name.endswith("_50patents.csv")
+    ]
+    for path in paths:
+        convert_csv(path)
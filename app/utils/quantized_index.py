@@ -0,0 +1,454 @@
+# utils/quantized_index.py
+"""
+Compact vector index, an alternative to Chroma's float32 HNSW storage
+(VECTOR_INDEX_BACKEND=quantized). It implements the part of the Chroma client
+and collection API the app uses: get_or_create_collection / get_collection /
+list_collections / delete_collection, and get / query / upsert / delete / count.
+
+Each collection is one directory:
+
+    vectors.i8 or vectors.f16   quantized vectors, memory-mapped, appended in place
+    rows.f32                    per row: int8 scale and exact squared norm
+    vectors.f32                 full-precision copies, only with QUANT_RESCORE
+    records.sqlite3             id -> slot, document and metadata
+
+Search is a blockwise NumPy scan over all rows, many queries at once. With
+QUANT_RESCORE the best k * QUANT_RESCORE_FACTOR candidates are re-scored
+against the full-precision copies. Distances are squared L2, as in Chroma's
+default space, so scores mean the same with either backend.
+"""
+import os
+import re
+import json
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# === CONFIGURATION ===
+QUANT_INDEX_DIR = os.getenv("QUANT_INDEX_DIR", os.path.join(os.path.dirname(__file__), "..", "quantized_index"))
+QUANT_DTYPE = os.getenv("QUANT_DTYPE", "int8")  # "int8" or "float16"; fixed per collection once created
+QUANT_RESCORE = os.getenv("QUANT_RESCORE", "false").lower() == "true"  # keep float32 copies for exact re-scoring
+QUANT_RESCORE_FACTOR = int(os.getenv("QUANT_RESCORE_FACTOR", "4"))  # candidates re-scored per result
+QUANT_SCAN_BLOCK = int(os.getenv("QUANT_SCAN_BLOCK", "16384"))  # rows scored per NumPy block
+
+DTYPES = {"int8": (np.int8, "i8"), "float16": (np.float16, "f16")}
+INITIAL_CAPACITY = 1024
+SQL_BATCH = 500
+VALID_NAME = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+class GrowableArray:
+    """A memory-mapped 2-D array that grows by doubling its file, so appends are cheap."""
+
+    def __init__(self, path: str, dtype, width: int):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.array: Optional[np.memmap] = None
+        if os.path.exists(path) and os.path.getsize(path):
+            capacity = os.path.getsize(path) // (self.dtype.itemsize * width)
+            self.array = np.memmap(path, dtype=self.dtype, mode="r+", shape=(capacity, width))
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.array is None else self.array.shape[0]
+
+    def refresh(self):
+        """Remap the file if another process has grown it."""
+        if os.path.exists(self.path):
+            capacity = os.path.getsize(self.path) // (self.dtype.itemsize * self.width)
+            if capacity > self.capacity:
+                self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity, self.width))
+
+    def reserve(self, rows: int):
+        self.refresh()
+        if rows <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        if self.array is not None:
+            self.array.flush()
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            f.truncate(capacity * self.width * self.dtype.itemsize)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity, self.width))
+
+    def flush(self):
+        if self.array is not None:
+            self.array.flush()
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantized rows and the per-row scale that restores them (symmetric int8, or plain float16)."""
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+    scale = np.abs(matrix).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    return np.round(matrix / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+
+def where_sql(where: Dict) -> Tuple[str, List]:
+    """
+    SQL condition for a Chroma-style metadata filter: {"key": value},
+    {"key": {"$eq" | "$ne" | "$in" | "$nin": ...}}, {"$and": [...]}, {"$or": [...]}.
+    """
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_sql(item) for item in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+        if not re.match(r"^[A-Za-z0-9_]+$", key):
+            raise ValueError(f"Unsupported metadata key: {key!r}")
+        field = f"json_extract(metadata, '$.{key}')"
+        operator, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+        if operator in ("$in", "$nin"):
+            marks = ",".join("?" * len(value)) or "NULL"
+            clauses.append(f"{field} {'IN' if operator == '$in' else 'NOT IN'} ({marks})")
+            params.extend(value)
+        elif operator in ("$eq", "$ne"):
+            clauses.append(f"{field} {'=' if operator == '$eq' else '!='} ?")
+            params.append(value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+class QuantizedCollection:
+    """
+    One collection of the quantized index. Safe to search from many threads and
+    processes while others write: writers take SQLite's write lock for the
+    whole upsert, and every process reloads its slot map when another commits.
+    """
+
+    def __init__(self, path: str, name: str, dtype: str = QUANT_DTYPE, rescore: bool = QUANT_RESCORE,
+                 embedding_function=None, metadata: Optional[Dict] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.name = name
+        self.embedding_function = embedding_function
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(
+            os.path.join(path, "records.sqlite3"), check_same_thread=False, isolation_level=None, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "id TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, document TEXT, metadata TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Another process may be creating the collection too; the first settings win
+        defaults = {"dtype": dtype, "rescore": str(rescore), "metadata": json.dumps(metadata), "size": "0"}
+        self.db.executemany("INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)", list(defaults.items()))
+        stored = dict(self.db.execute("SELECT name, value FROM meta").fetchall())
+        if stored["dtype"] not in DTYPES:
+            raise ValueError(f"Unsupported QUANT_DTYPE: {stored['dtype']}")
+
+        self.dtype = stored["dtype"]
+        self.rescore = stored["rescore"] == "True"
+        self.metadata = json.loads(stored["metadata"])
+        self.size = 0  # slots used, including deleted ones
+        self.dim = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.vectors = self.rows = self.exact = None
+        self.data_version = None
+        self._sync()
+
+    def _sync(self):
+        """Reload size, dimension and live slots if another connection has committed since the last look."""
+        data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return
+        self.data_version = data_version
+        stored = dict(self.db.execute(
+            "SELECT name, value FROM meta WHERE name IN ('size', 'dim', 'metadata')").fetchall())
+        self.size = int(stored["size"])
+        self.metadata = json.loads(stored["metadata"])
+        if self.dim is None and "dim" in stored:
+            self.dim = int(stored["dim"])
+            self._open_arrays()
+        alive = np.zeros(self.size, dtype=bool)
+        alive[[slot for (slot,) in self.db.execute("SELECT slot FROM records")]] = True
+        self.alive = alive
+        for array in self._arrays():
+            array.refresh()
+
+    def _open_arrays(self):
+        dtype, suffix = DTYPES[self.dtype]
+        self.vectors = GrowableArray(os.path.join(self.path, f"vectors.{suffix}"), dtype, self.dim)
+        self.rows = GrowableArray(os.path.join(self.path, "rows.f32"), np.float32, 2)
+        if self.rescore:
+            self.exact = GrowableArray(os.path.join(self.path, "vectors.f32"), np.float32, self.dim)
+
+    def _arrays(self) -> List[GrowableArray]:
+        return [array for array in (self.vectors, self.rows, self.exact) if array is not None]
+
+    @contextmanager
+    def _write_transaction(self):
+        """
+        BEGIN IMMEDIATE holds SQLite's write lock, so writers in other processes
+        wait, and the size read after it cannot hand out a slot someone else took.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self._sync()
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            self.data_version = None  # in-memory state may be ahead of the database
+            raise
+        self.db.execute("COMMIT")
+
+    def _slots(self, ids: List[str]) -> Dict[str, int]:
+        found = {}
+        for start in range(0, len(ids), SQL_BATCH):
+            batch = ids[start:start + SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            found.update(self.db.execute(f"SELECT id, slot FROM records WHERE id IN ({marks})", batch).fetchall())
+        return found
+
+    def _records(self, slots: List[int]) -> Dict[int, Tuple[str, str, str]]:
+        found = {}
+        for start in range(0, len(slots), SQL_BATCH):
+            batch = slots[start:start + SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            for slot, doc_id, document, metadata in self.db.execute(
+                    f"SELECT slot, id, document, metadata FROM records WHERE slot IN ({marks})", batch):
+                found[slot] = (doc_id, document, metadata)
+        return found
+
+    def modify(self, metadata: Optional[Dict] = None):
+        """Replace the collection metadata (the only modification the app makes)."""
+        if metadata is None:
+            return
+        with self.lock, self._write_transaction():
+            self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('metadata', ?)",
+                            (json.dumps(metadata),))
+            self.metadata = metadata
+
+    def count(self) -> int:
+        with self.lock:
+            self._sync()
+            return int(self.alive.sum())
+
+    def upsert(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None):
+        """Add or replace records. New records are appended; replaced ones are rewritten in place."""
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self.lock, self._write_transaction():
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._open_arrays()
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match collection ({self.dim})")
+
+            size = self.size
+            slots = self._slots(list(ids))
+            for doc_id in ids:
+                if doc_id not in slots:
+                    slots[doc_id] = size
+                    size += 1
+            index = np.array([slots[doc_id] for doc_id in ids])
+            for array in self._arrays():
+                array.reserve(size)
+
+            # Vectors land before the records that point at them become visible
+            quantized, scale = quantize(matrix, self.dtype)
+            self.vectors.array[index] = quantized
+            self.rows.array[index, 0] = scale
+            self.rows.array[index, 1] = np.einsum("ij,ij->i", matrix, matrix)
+            if self.exact is not None:
+                self.exact.array[index] = matrix
+            for array in self._arrays():
+                array.flush()
+
+            self.db.executemany(
+                "INSERT OR REPLACE INTO records (id, slot, document, metadata) VALUES (?, ?, ?, ?)",
+                [(doc_id, slots[doc_id], document, json.dumps(metadata))
+                 for doc_id, document, metadata in zip(ids, documents, metadatas)])
+            self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('size', ?)", (str(size),))
+
+            alive = np.zeros(size, dtype=bool)
+            alive[:len(self.alive)] = self.alive
+            alive[index] = True
+            self.size, self.alive = size, alive
+
+    add = upsert
+
+    def delete(self, ids: List[str]):
+        """Remove records. Their slots stay allocated on disk and are skipped by searches."""
+        with self.lock, self._write_transaction():
+            slots = list(self._slots(list(ids)).values())
+            if not slots:
+                return
+            self.db.executemany("DELETE FROM records WHERE slot = ?", [(slot,) for slot in slots])
+            alive = self.alive.copy()
+            alive[slots] = False
+            self.alive = alive
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include=("metadatas", "documents"), limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        """Records by ID, or all (optionally filtered) records in insertion order, paged by limit/offset."""
+        with self.lock:
+            if ids is not None:
+                rows = list(self._records(sorted(self._slots(list(ids)).values())).values())
+            else:
+                condition, params = where_sql(where or {})
+                sql = f"SELECT id, document, metadata FROM records WHERE {condition} ORDER BY slot"
+                if limit is not None or offset:
+                    sql += f" LIMIT {int(limit if limit is not None else -1)} OFFSET {int(offset or 0)}"
+                rows = self.db.execute(sql, params).fetchall()
+        return {
+            "ids": [doc_id for doc_id, _, _ in rows],
+            "documents": [document for _, document, _ in rows] if "documents" in include else None,
+            "metadatas": [json.loads(metadata) for _, _, metadata in rows] if "metadatas" in include else None,
+        }
+
+    def query(self, query_embeddings=None, query_texts: Optional[List[str]] = None, n_results: int = 10,
+              where: Optional[Dict] = None, include=("metadatas", "documents", "distances")) -> Dict:
+        """Nearest records for each query, as Chroma returns them: one list per query, nearest first."""
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(1, -1) if queries.ndim == 1 else queries
+
+        # Search a consistent snapshot; writers only ever append or replace whole arrays
+        with self.lock:
+            self._sync()
+            size, alive = self.size, self.alive[:self.size]
+            if self.dim is None or not size:
+                return self._results([[] for _ in queries], [[] for _ in queries], include)
+            vectors, rows = self.vectors.array, self.rows.array
+            exact = self.exact.array if self.exact is not None else None
+            if where:
+                condition, params = where_sql(where)
+                mask = np.zeros(size, dtype=bool)
+                mask[[slot for (slot,) in self.db.execute(
+                    f"SELECT slot FROM records WHERE {condition}", params) if slot < size]] = True
+                alive = alive & mask
+
+        wanted = min(n_results, int(alive.sum()))
+        if wanted == 0:
+            return self._results([[] for _ in queries], [[] for _ in queries], include)
+        candidates = min(wanted * QUANT_RESCORE_FACTOR, int(alive.sum())) if exact is not None else wanted
+
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        best_slots = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, size, QUANT_SCAN_BLOCK):
+            end = min(size, start + QUANT_SCAN_BLOCK)
+            block_alive = alive[start:end]
+            if not block_alive.any():
+                continue
+            dots = queries @ np.asarray(vectors[start:end], dtype=np.float32).T
+            if self.dtype == "int8":
+                dots *= rows[start:end, 0]
+            distances = query_norms + rows[start:end, 1] - 2 * dots
+            distances[:, ~block_alive] = np.inf
+            slots = np.broadcast_to(np.arange(start, end), distances.shape)
+            distances = np.concatenate([best_distances, distances], axis=1)
+            slots = np.concatenate([best_slots, slots], axis=1)
+            if distances.shape[1] > candidates:
+                keep = np.argpartition(distances, candidates - 1, axis=1)[:, :candidates]
+                distances = np.take_along_axis(distances, keep, axis=1)
+                slots = np.take_along_axis(slots, keep, axis=1)
+            best_distances, best_slots = distances, slots
+
+        if exact is not None:
+            originals = exact[best_slots.ravel()].reshape(best_slots.shape + (self.dim,))
+            rescored = ((originals - queries[:, None, :]) ** 2).sum(axis=2)
+            best_distances = np.where(np.isinf(best_distances), np.inf, rescored)
+        order = np.argsort(best_distances, axis=1)[:, :wanted]
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_slots = np.take_along_axis(best_slots, order, axis=1)
+        return self._results(best_slots.tolist(), best_distances.tolist(), include)
+
+    def _results(self, slots: List[List[int]], distances: List[List[float]], include) -> Dict:
+        with self.lock:
+            records = self._records(sorted({slot for row in slots for slot in row}))
+        ids, documents, metadatas, kept_distances = [], [], [], []
+        for row_slots, row_distances in zip(slots, distances):
+            row = [(records[slot], distance) for slot, distance in zip(row_slots, row_distances)
+                   if slot in records and np.isfinite(distance)]
+            ids.append([record[0] for record, _ in row])
+            documents.append([record[1] for record, _ in row])
+            metadatas.append([json.loads(record[2]) for record, _ in row])
+            kept_distances.append([max(0.0, float(distance)) for _, distance in row])
+        return {
+            "ids": ids,
+            "documents": documents if "documents" in include else None,
+            "metadatas": metadatas if "metadatas" in include else None,
+            "distances": kept_distances if "distances" in include else None,
+        }
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    def close(self):
+        with self.lock:
+            for array in self._arrays():
+                array.flush()
+            self.vectors = self.rows = self.exact = None
+            self.db.close()
+
+
+class QuantizedClient:
+    """Stands in for chromadb.PersistentClient: one QuantizedCollection directory per collection under `path`."""
+
+    def __init__(self, path: str = QUANT_INDEX_DIR, dtype: str = QUANT_DTYPE, rescore: bool = QUANT_RESCORE):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = dtype
+        self.rescore = rescore
+        self.collections: Dict[str, QuantizedCollection] = {}
+        self.lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> str:
+        if not VALID_NAME.match(name):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        return os.path.join(self.path, name)
+
+    def get_or_create_collection(self, name: str, embedding_function=None,
+                                 metadata: Optional[Dict] = None) -> QuantizedCollection:
+        with self.lock:
+            collection = self.collections.get(name)
+            if collection is None:
+                collection = self.collections[name] = QuantizedCollection(
+                    self._collection_path(name), name, self.dtype, self.rescore, embedding_function, metadata)
+            if embedding_function is not None:
+                collection.embedding_function = embedding_function
+            return collection
+
+    def get_collection(self, name: str, embedding_function=None) -> QuantizedCollection:
+        if name not in self.collections and not os.path.isdir(self._collection_path(name)):
+            raise ValueError(f"Collection {name} does not exist")
+        return self.get_or_create_collection(name, embedding_function)
+
+    def list_collections(self) -> List[QuantizedCollection]:
+        names = sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self.path, name, "records.sqlite3")))
+        return [self.get_collection(name) for name in names]
+
+    def delete_collection(self, name: str):
+        path = self._collection_path(name)
+        with self.lock:
+            collection = self.collections.pop(name, None)
+            if collection is None and not os.path.isdir(path):
+                raise ValueError(f"Collection {name} does not exist")
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(path, ignore_errors=True)
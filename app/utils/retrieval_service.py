@@ -0,0 +1,343 @@
+# utils/retrieval_service.py
+"""
+Retrieval service: one local process that owns the Chroma index, the BM25
+index and the embedding model, serving API workers over a Unix socket.
+
+    python -m app.utils.retrieval_service          # start the service
+    VECTOR_STORE_MODE=remote uvicorn main:app --workers 4
+
+Workers then get a RemoteVectorStore from get_vector_store(), with the same
+methods the API uses on a local VectorStore, so the model and index are
+loaded once however many workers run. Embedding requests arriving together
+from any worker are coalesced into one model call, and all writes go through
+a single writer thread, so concurrent ingestion jobs never contend for SQLite.
+"""
+import os
+import json
+import time
+import socket
+import struct
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.utils.tracing import current_trace_id, log_event, trace_id_var
+from app.utils.vector_store import UnknownTopic, VectorStore
+
+# === CONFIGURATION ===
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "/tmp/patentai-retrieval.sock")
+RETRIEVAL_BATCH_WINDOW = float(os.getenv("RETRIEVAL_BATCH_WINDOW", "0.003"))  # seconds to gather a batch
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "64"))  # texts per embedding call
+RETRIEVAL_SERVICE_THREADS = int(os.getenv("RETRIEVAL_SERVICE_THREADS", "4"))  # concurrent searches
+RETRIEVAL_CALL_TIMEOUT = float(os.getenv("RETRIEVAL_CALL_TIMEOUT", "8"))  # per search call; below RETRIEVAL_TIMEOUT
+RETRIEVAL_SERVICE_TIMEOUT = float(os.getenv("RETRIEVAL_SERVICE_TIMEOUT", "120"))  # per ingestion/warm-up call
+RETRIEVAL_CONNECT_TIMEOUT = float(os.getenv("RETRIEVAL_CONNECT_TIMEOUT", "120"))  # wait for the service at startup
+SLOW_OPS = ("upsert_batch", "drop_topic", "warm_up")
+
+HEADER = struct.Struct("!I")
+MAX_FRAME = 64 * 2 ** 20
+
+
+class RetrievalServiceError(RuntimeError):
+    """The retrieval service failed a request or could not be reached."""
+
+
+# === WIRE FORMAT: length-prefixed JSON ===
+def encode_frame(message: Dict) -> bytes:
+    payload = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Retrieval service closed the connection")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_frame(sock: socket.socket) -> Dict:
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes exceeds the limit")
+    return json.loads(_recv_exactly(sock, size))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Dict:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes exceeds the limit")
+    return json.loads(await reader.readexactly(size))
+
+
+def _as_lists(vectors) -> List[List[float]]:
+    return [[float(x) for x in vector] for vector in vectors]
+
+
+# === SERVER ===
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests: texts arriving within RETRIEVAL_BATCH_WINDOW
+    of each other (or until RETRIEVAL_MAX_BATCH texts are waiting) are embedded
+    in one model call on the model's own thread, and each caller gets its slice.
+    """
+
+    def __init__(self, embedding_fn, window: float = RETRIEVAL_BATCH_WINDOW, max_batch: int = RETRIEVAL_MAX_BATCH):
+        self.embedding_fn = embedding_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self.pending: List = []
+        self.pending_texts = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((texts, future))
+        self.pending_texts += len(texts)
+        if self.pending_texts >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending, self.pending_texts = self.pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        texts = [text for item_texts, _ in batch for text in item_texts]
+        self.batches += 1
+        self.texts += len(texts)
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self.executor, lambda: _as_lists(self.embedding_fn(texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for item_texts, future in batch:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(item_texts)])
+            offset += len(item_texts)
+
+
+class RetrievalServer:
+    """Serves one VectorStore to many API workers over a Unix socket."""
+
+    def __init__(self, store: VectorStore, path: str = RETRIEVAL_SOCKET):
+        self.store = store
+        self.path = path
+        self.batcher = EmbeddingBatcher(store.embedding_fn)
+        self.readers = ThreadPoolExecutor(max_workers=RETRIEVAL_SERVICE_THREADS, thread_name_prefix="search")
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self.requests = 0
+
+    async def _in(self, executor, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def dispatch(self, op: str, args: Dict):
+        # Imported here: both modules import the vector store this service wraps
+        from app.chat_interface import retrieve_context
+        from app.utils.batch_search import search_batch
+        from app.utils.vector_uploader import upsert_batch
+
+        store = self.store
+        if op == "embed":
+            return await self.batcher.embed(args["texts"])
+        if op == "retrieve":
+            embedding = args.get("embedding")
+            if embedding is None:
+                embedding = (await self.batcher.embed([args["message"]]))[0]
+            return list(await self._in(self.readers, retrieve_context, store, args["message"],
+                                       embedding, args.get("topic")))
+        if op == "search_batch":
+            embeddings = await self.batcher.embed(args["queries"])
+            return await self._in(self.readers, search_batch, store, args["queries"], args["k"],
+                                  args.get("topic"), args.get("sections"), embeddings)
+        if op == "require_topic":
+            return await self._in(self.readers, lambda: store.collections(args["topic"]) and None)
+        if op == "topic_exists":
+            return await self._in(self.readers, store.topic_exists, args["topic"])
+        if op == "list_topics":
+            return await self._in(self.readers, store.list_topics)
+        if op == "upsert_batch":
+            return await self._in(self.writer, lambda: upsert_batch(
+                store, args["rows"], topic=args.get("topic"), chunked=args["chunked"], batch_size=args["batch_size"]))
+        if op == "mark_topic_complete":
+            return await self._in(self.writer, store.mark_topic_complete, args["topic"])
+        if op == "drop_topic":
+            return await self._in(self.writer, store.drop_topic, args["topic"])
+        if op == "warm_up":
+            return await self._in(self.writer, store.warm_up)
+        if op == "stats":
+            return {"requests": self.requests, "embedding_batches": self.batcher.batches,
+                    "embedded_texts": self.batcher.texts}
+        raise ValueError(f"Unknown operation: {op}")
+
+    async def handle_request(self, request: Dict, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        self.requests += 1
+        token = trace_id_var.set(request.get("trace_id"))
+        try:
+            response = {"id": request.get("id"), "result": await self.dispatch(request["op"], request.get("args", {}))}
+        except Exception as e:
+            response = {"id": request.get("id"), "error": {
+                "type": type(e).__name__, "message": str(e), "topic": getattr(e, "topic", None)}}
+            if not isinstance(e, (UnknownTopic, ValueError)):
+                log_event("retrieval_service_error", op=request.get("op"), error=repr(e))
+        finally:
+            trace_id_var.reset(token)
+        async with lock:
+            writer.write(encode_frame(response))
+            await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests on one connection may be pipelined; each is answered as it completes
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                request = await read_frame(reader)
+                task = asyncio.create_task(self.handle_request(request, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket of a previous run
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.path)
+        os.chmod(self.path, 0o660)
+        print(f"🛰️ Retrieval service listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+
+# === CLIENT ===
+class RemoteVectorStore:
+    """
+    Stand-in for VectorStore in API workers when VECTOR_STORE_MODE=remote. Each
+    thread keeps its own connection to the retrieval service; calls block, like
+    the local store's, and run on the same executor threads. Only warm_up()
+    waits for the service to come up; other calls fail at once when it is
+    down, so they never hold a retrieval thread past RETRIEVAL_TIMEOUT.
+    """
+
+    remote = True
+
+    def __init__(self, path: str = RETRIEVAL_SOCKET, timeout: float = RETRIEVAL_CALL_TIMEOUT,
+                 slow_timeout: float = RETRIEVAL_SERVICE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.slow_timeout = slow_timeout
+        self.local = threading.local()
+        self.next_id = 0
+
+    def _connect(self, wait: float = 0.0) -> socket.socket:
+        deadline = time.monotonic() + wait
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise RetrievalServiceError(f"Retrieval service not reachable at {self.path}: {e}")
+                time.sleep(0.5)
+
+    def call(self, op: str, **args):
+        self.next_id += 1
+        request = encode_frame({"id": self.next_id, "op": op, "args": args, "trace_id": current_trace_id()})
+        sock = getattr(self.local, "sock", None)
+        try:
+            if sock is None:
+                sock = self.local.sock = self._connect()
+            sock.settimeout(self.slow_timeout if op in SLOW_OPS else self.timeout)
+            sock.sendall(request)
+            response = recv_frame(sock)
+        except (OSError, ConnectionError) as e:
+            self.local.sock = None
+            if sock is not None:
+                sock.close()
+            raise RetrievalServiceError(f"Retrieval service call '{op}' failed: {e}")
+
+        error = response.get("error")
+        if error:
+            if error["type"] == "UnknownTopic":
+                raise UnknownTopic(error["topic"])
+            if error["type"] in ("ValueError", "FileNotFoundError"):
+                raise {"ValueError": ValueError, "FileNotFoundError": FileNotFoundError}[error["type"]](error["message"])
+            raise RetrievalServiceError(f"{error['type']}: {error['message']}")
+        return response["result"]
+
+    # Same surface as VectorStore, as used by the API, chat and ingestion
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.call("embed", texts=list(texts))
+
+    def retrieve_context(self, message: str, embedding=None, topic: Optional[str] = None):
+        if embedding is not None:
+            embedding = [float(x) for x in embedding]
+        context, pids, tokens = self.call("retrieve", message=message, embedding=embedding, topic=topic)
+        return context, pids, tokens
+
+    def search_batch(self, queries: List[str], k: int, topic: Optional[str] = None,
+                     sections: Optional[List[str]] = None) -> List[Dict]:
+        return self.call("search_batch", queries=list(queries), k=k, topic=topic, sections=sections)
+
+    def require_topic(self, topic: str):
+        self.call("require_topic", topic=topic)
+
+    def topic_exists(self, topic: str) -> bool:
+        return self.call("topic_exists", topic=topic)
+
+    def list_topics(self) -> List[Dict]:
+        return self.call("list_topics")
+
+    def upsert_batch(self, rows: List[Dict[str, str]], topic: Optional[str], chunked: bool, batch_size: int) -> int:
+        return self.call("upsert_batch", rows=rows, topic=topic, chunked=chunked, batch_size=batch_size)
+
+    def mark_topic_complete(self, topic: str):
+        self.call("mark_topic_complete", topic=topic)
+
+    def drop_topic(self, topic: str) -> bool:
+        return self.call("drop_topic", topic=topic)
+
+    def warm_up(self) -> float:
+        start = time.perf_counter()
+        if getattr(self.local, "sock", None) is None:
+            self.local.sock = self._connect(wait=RETRIEVAL_CONNECT_TIMEOUT)
+        self.call("warm_up")
+        elapsed = time.perf_counter() - start
+        print(f"🔥 Retrieval service at {self.path} ready in {elapsed:.2f}s")
+        return elapsed
+
+
+if __name__ == "__main__":
+    from app.utils.tracing import configure_logging
+    from app.utils.vector_store import get_vector_store
+
+    configure_logging()
+    store = get_vector_store(mode="local")
+    store.warm_up()
+    try:
+        asyncio.run(RetrievalServer(store).serve())
+    except KeyboardInterrupt:
+        pass
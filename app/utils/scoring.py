@@ -0,0 +1,9 @@
+# utils/scoring.py
+
+
+def distance_to_score(distance: float) -> float:
+    """
+    Similarity score of a vector search hit. Chroma and the quantized index both
+    return squared L2 distances between unit vectors, so 1 - d/2 is the cosine similarity.
+    """
+    return 1.0 - distance / 2
@@ -0,0 +1,130 @@
+# utils/session_cache.py
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+
+from redis.exceptions import ResponseError
+
+from app.utils.metrics import Gauge
+
+# === CONFIGURATION ===
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))  # Redis session lifetime
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))  # seconds a worker trusts its copy
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+SESSION_KEY = "session:{}"
+INVALIDATION_CHANNEL = "session:invalidate"
+
+
+class SessionCache:
+    """
+    Per-worker cache of session_id -> user email in front of Redis. Entries live
+    for SESSION_CACHE_TTL at most, and never past the session's own Redis expiry.
+    Logouts are broadcast over Redis pub/sub so every worker drops its copy.
+    """
+
+    def __init__(self, ttl: float = SESSION_CACHE_TTL, max_entries: int = SESSION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str) -> Optional[str]:
+        entry = self.entries.get(session_id)
+        if entry is None:
+            return None
+        email, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[session_id]
+            return None
+        self.entries.move_to_end(session_id)
+        return email
+
+    def put(self, session_id: str, email: str, ttl: float):
+        self.entries[session_id] = (email, time.monotonic() + min(self.ttl, ttl))
+        self.entries.move_to_end(session_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def evict(self, session_id: str):
+        self.entries.pop(session_id, None)
+
+    def clear(self):
+        self.entries.clear()
+
+
+cache = SessionCache()
+Gauge("patentai_session_cache", "Worker session cache hits, misses and entries.", ["stat"]).set_function(
+    lambda: {"hits": cache.hits, "misses": cache.misses, "entries": len(cache.entries)})
+
+
+def valid_session_id(session_id: str) -> bool:
+    """Session IDs are canonical UUID strings, as issued at login."""
+    try:
+        return str(UUID(session_id)) == session_id
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+async def get_session_user(redis_client, session_id: str) -> Optional[str]:
+    """Resolve a session to its user email, from the worker cache or one Redis round trip."""
+    if not valid_session_id(session_id):
+        return None
+    email = cache.get(session_id)
+    if email is not None:
+        cache.hits += 1
+        return email
+
+    cache.misses += 1
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(SESSION_KEY.format(session_id))
+        pipe.pttl(SESSION_KEY.format(session_id))
+        try:
+            email, pttl = await pipe.execute()
+        except ResponseError:
+            # WRONGTYPE: the key holds something other than a session
+            return None
+    if email:
+        # A key without expiry reports -1; fall back to the cache TTL
+        cache.put(session_id, email, pttl / 1000 if pttl > 0 else SESSION_CACHE_TTL)
+    return email
+
+
+async def create_session(redis_client, session_id: str, email: str):
+    await redis_client.set(SESSION_KEY.format(session_id), email, ex=SESSION_TTL)
+    cache.put(session_id, email, SESSION_TTL)
+
+
+async def end_session(redis_client, session_id: str) -> bool:
+    """Delete a session and tell every worker to forget it."""
+    if not valid_session_id(session_id):
+        return False
+    cache.evict(session_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.delete(SESSION_KEY.format(session_id))
+        pipe.publish(INVALIDATION_CHANNEL, session_id)
+        deleted, _ = await pipe.execute()
+    return bool(deleted)
+
+
+async def listen_for_invalidations(redis_client):
+    """Background task: evict sessions other workers have ended. Runs until cancelled."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Invalidations may have been missed while disconnected
+            cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    cache.evict(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Session invalidation listener error: {e}; retrying")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
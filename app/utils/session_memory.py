@@ -0,0 +1,50 @@
+# utils/session_memory.py
+import os
+import json
+from typing import List, Dict
+
+from app.utils.tokens import estimate_tokens
+
+# === CONFIGURATION ===
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "10"))  # sliding window per session
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "400"))  # history tokens sent to the LLM
+MEMORY_TTL = int(os.getenv("MEMORY_TTL", "86400"))  # matches the session expiry
+
+HISTORY_KEY = "chat_history:{}"
+
+
+def format_turn(turn: Dict[str, str]) -> str:
+    return f"Human: {turn['question']}\nAI: {turn['answer']}"
+
+
+def fit_to_budget(turns: List[Dict[str, str]], budget: int = MEMORY_TOKEN_BUDGET) -> str:
+    """Keep the most recent whole turns that fit the token budget, oldest first."""
+    kept, used = [], 0
+    for turn in reversed(turns):
+        text = format_turn(turn)
+        tokens = estimate_tokens(text)
+        if used + tokens > budget:
+            break
+        kept.append(text)
+        used += tokens
+    return "\n".join(reversed(kept))
+
+
+async def load_history(redis_client, session_id: str) -> str:
+    """Load a session's recent turns in one round trip and render them for the prompt."""
+    raw = await redis_client.lrange(HISTORY_KEY.format(session_id), -MEMORY_MAX_TURNS, -1)
+    return fit_to_budget([json.loads(item) for item in raw])
+
+
+async def save_turn(redis_client, session_id: str, question: str, answer: str):
+    """Append a turn, trim to the sliding window and refresh the TTL in one round trip."""
+    key = HISTORY_KEY.format(session_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, json.dumps({"question": question, "answer": answer}))
+        pipe.ltrim(key, -MEMORY_MAX_TURNS, -1)
+        pipe.expire(key, MEMORY_TTL)
+        await pipe.execute()
+
+
+async def clear_history(redis_client, session_id: str):
+    await redis_client.delete(HISTORY_KEY.format(session_id))
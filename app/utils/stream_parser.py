@@ -0,0 +1,115 @@
+# utils/stream_parser.py
+"""
+Incremental parser for the model's <response> format, for streamed completions.
+
+    <response>
+        <answer> ... </answer>
+        <patents><pid>PID1</pid><pid>PID2</pid></patents>
+    </response>
+
+Text is fed as it arrives and may split tags and entities anywhere. feed()
+returns the answer text that is now certain, unescaped, and the PIDs whose
+element has closed. Surrounding whitespace of the answer is dropped, so the
+concatenated deltas equal the answer parse_response would give for the same text.
+"""
+import re
+from typing import List, Tuple
+from xml.sax.saxutils import unescape
+
+ENTITIES = {"&quot;": '"', "&apos;": "'"}
+PID_TAGS = ("pid", "id")
+MAX_ENTITY = 8  # longest entity held back while waiting for its ";"
+
+
+class ResponseStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.state = "outside"  # "outside", "answer" or "pid"
+        self.pid = ""
+        self.answer_started = False
+        self.seen_answer = False
+        self.pending_space = ""
+        self.raw = []
+        self.answer = []
+        self.pids: List[str] = []
+
+    def feed(self, text: str) -> Tuple[str, List[str]]:
+        """Consume a chunk; returns (new answer text, newly closed PIDs)."""
+        self.raw.append(text)
+        self.buffer += text
+        deltas, pids = [], []
+        while self.buffer:
+            lt = self.buffer.find("<")
+            if self.state == "answer":
+                # Emit everything before the next tag, holding back a split entity
+                end = lt if lt >= 0 else len(self.buffer)
+                amp = self.buffer.rfind("&", max(0, end - MAX_ENTITY), end)
+                if lt < 0 and amp >= 0 and ";" not in self.buffer[amp:end]:
+                    end = amp
+                deltas.append(self._answer_text(self.buffer[:end]))
+                self.buffer = self.buffer[end:]
+                if lt < 0 or self.buffer[0] != "<":
+                    break
+            elif self.state == "pid":
+                if lt < 0:
+                    break
+                self.pid += self.buffer[:lt]
+                self.buffer = self.buffer[lt:]
+            elif lt < 0:
+                self.buffer = ""
+                break
+            else:
+                self.buffer = self.buffer[lt:]
+
+            gt = self.buffer.find(">")
+            if gt < 0:
+                break  # tag not complete yet
+            tag = self.buffer[1:gt].strip().lower()
+            self.buffer = self.buffer[gt + 1:]
+            name = re.split(r"[\s/]", tag.lstrip("/"), maxsplit=1)[0]
+            if self.state == "answer":
+                if tag.startswith("/") and name == "answer":
+                    self.state = "outside"
+            elif self.state == "pid":
+                pid = unescape(self.pid, ENTITIES).strip()
+                if pid and pid not in self.pids:
+                    self.pids.append(pid)
+                    pids.append(pid)
+                self.state = "outside"
+            elif not tag.startswith("/") and not tag.endswith("/"):
+                if name == "answer" and not self.seen_answer:
+                    self.state, self.seen_answer = "answer", True
+                elif name in PID_TAGS:
+                    self.state, self.pid = "pid", ""
+        return "".join(deltas), pids
+
+    def close(self) -> Tuple[str, List[str]]:
+        """End of the stream. Returns (the full answer, all PIDs), "[No answer]" without an <answer>."""
+        if self.state == "answer" and self.buffer:
+            self._answer_text(self.buffer)
+            self.buffer = ""
+        if not self.seen_answer:
+            return "[No answer]", list(self.pids)
+        return "".join(self.answer), list(self.pids)
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self.raw)
+
+    def _answer_text(self, chunk: str) -> str:
+        text = unescape(chunk, ENTITIES)
+        if not self.answer_started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self.answer_started = True
+        # Trailing whitespace is only emitted once more text follows it
+        body = text.rstrip()
+        if not body:
+            self.pending_space += text
+            return ""
+        delta = self.pending_space + body
+        self.pending_space = text[len(body):]
+        self.answer.append(delta)
+        return delta
@@ -0,0 +1,12 @@
+# utils/tokens.py
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate: words and punctuation marks, scaled up a little since
+    subword tokenizers split long and rare words.
+    """
+    return int(len(TOKEN_PATTERN.findall(text)) * 1.3) + 1 if text else 0
@@ -0,0 +1,17 @@
+# utils/topics.py
+import re
+
+# Per-topic collections are named "<base>__<topic>", e.g. "patent_docs__coffee"
+TOPIC_SEPARATOR = "__"
+
+
+def normalize_topic(topic: str) -> str:
+    """Lowercase, underscore-separated topic name that is also a valid collection suffix."""
+    slug = re.sub(r"[^a-z0-9_-]+", "_", topic.strip().lower()).strip("_-")
+    if not slug:
+        raise ValueError(f"Invalid topic: {topic!r}")
+    return slug
+
+
+def topic_collection_name(base: str, topic: str) -> str:
+    return f"{base}{TOPIC_SEPARATOR}{normalize_topic(topic)}"
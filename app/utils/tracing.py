@@ -0,0 +1,117 @@
+# utils/tracing.py
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.utils.metrics import Histogram
+
+# === CONFIGURATION ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+TRACE_HEADER = "x-trace-id"
+INCOMING_TRACE_HEADERS = (b"x-trace-id", b"x-request-id")
+VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+logger = logging.getLogger("patentai")
+
+HTTP_SECONDS = Histogram(
+    "patentai_http_request_seconds", "HTTP request latency by route and status.", ["method", "route", "status"])
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, event, trace_id and the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "trace_id": trace_id_var.get(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Send the app's structured events to stdout as JSON lines. Safe to call more than once."""
+    if not any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """Log a structured event, tagged with the current request's trace ID."""
+    logger.log(level, event, extra={"fields": fields})
+
+
+def route_template(scope) -> str:
+    """
+    The matched route's path template, e.g. "/api/topic/status/{job_id}", so
+    metrics are labelled per endpoint rather than per concrete URL. Routes of an
+    included router may only know their path below the router prefix; the
+    prefix is then taken from the request path.
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    depth = template.count("/")
+    path = scope.get("path", "")
+    if path.count("/") > depth:
+        return "/".join(path.split("/")[:-depth]) + template
+    return template
+
+
+class TraceMiddleware:
+    """
+    Gives every HTTP request a trace ID (the caller's X-Trace-ID / X-Request-ID
+    if valid, else a new one), echoes it back in X-Trace-ID, records the request
+    latency by route template and logs one "request" event when it completes.
+    Work started from the request, including background tasks, inherits the ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        incoming = next((headers[h].decode("latin-1") for h in INCOMING_TRACE_HEADERS if h in headers), "")
+        trace_id = incoming if VALID_TRACE_ID.match(incoming) else uuid.uuid4().hex
+        token = trace_id_var.set(trace_id)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message["headers"]) + [(TRACE_HEADER.encode(), trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = route_template(scope)
+            HTTP_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            log_event("request", method=scope["method"], route=route, path=scope["path"],
+                      status=status, duration_ms=round(elapsed * 1000, 1))
+            trace_id_var.reset(token)
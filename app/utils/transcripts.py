@@ -0,0 +1,164 @@
+# utils/transcripts.py
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+# === CONFIGURATION ===
+TRANSCRIPT_BATCH_SIZE = int(os.getenv("TRANSCRIPT_BATCH_SIZE", "100"))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", "1.0"))  # seconds
+TRANSCRIPT_QUEUE_SIZE = int(os.getenv("TRANSCRIPT_QUEUE_SIZE", "10000"))  # exchanges buffered per worker
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+COLLECTION = "transcripts"
+# Serves "latest exchanges of a user" with no in-memory sort; _id breaks timestamp ties
+HISTORY_INDEX = [("user", 1), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+
+
+class TranscriptWriter:
+    """
+    Buffers chat exchanges in memory and writes them to Mongo in batches from a
+    background task, so persisting a transcript never adds to response latency.
+    A batch is written once it is full or TRANSCRIPT_FLUSH_INTERVAL has passed.
+    If Mongo falls behind and the buffer fills, new exchanges are dropped (and
+    counted) rather than slowing down chat.
+    """
+
+    def __init__(self, db, batch_size: int = TRANSCRIPT_BATCH_SIZE,
+                 flush_interval: float = TRANSCRIPT_FLUSH_INTERVAL, max_queue: int = TRANSCRIPT_QUEUE_SIZE):
+        self.collection = db[COLLECTION]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.batch: List[Dict] = []  # being gathered by the task; close() flushes it
+        self.writing: Optional[asyncio.Future] = None  # the batch being written, which close() waits for
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, exchange: Dict) -> bool:
+        """Queue an exchange for writing; never waits. Returns False if it was dropped."""
+        exchange.setdefault("timestamp", datetime.now(timezone.utc))
+        try:
+            self.queue.put_nowait(exchange)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 5.0):
+        """Stop the writer, letting a write in progress finish and flushing what is still buffered."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        batch, self.batch = self.batch, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        writes = [self._write(batch)] if batch else []
+        if self.writing is not None and not self.writing.done():
+            writes.append(self.writing)
+        if writes:
+            try:
+                await asyncio.wait_for(asyncio.gather(*writes), timeout)
+            except asyncio.TimeoutError:
+                self.failed += len(batch)
+                print(f"⚠️ Dropped {len(batch)} transcripts on shutdown: Mongo did not answer in {timeout}s")
+
+    def _drain(self, batch: List[Dict]) -> List[Dict]:
+        while not self.queue.empty() and len(batch) < self.batch_size:
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _collect(self) -> List[Dict]:
+        """Wait for one exchange, then gather more until the batch is full or the interval ends."""
+        batch = self.batch
+        batch.append(await self.queue.get())
+        # Unlike wait_for, asyncio.timeout never swallows a cancel that races with a get
+        try:
+            async with asyncio.timeout(self.flush_interval):
+                while len(batch) < self.batch_size:
+                    batch.append(await self.queue.get())
+                    self._drain(batch)
+        except asyncio.TimeoutError:
+            pass
+        return batch
+
+    async def _write(self, batch: List[Dict]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"⚠️ Failed to write {len(batch)} transcripts: {e}")
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batch = []
+            # Shielded: cancelling the task must not abort (and close() must not repeat) a write under way
+            self.writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self.writing)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self.queue.qsize(), "written": self.written,
+                "dropped": self.dropped, "failed": self.failed}
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index(HISTORY_INDEX, name="user_timestamp")
+
+
+def encode_cursor(doc: Dict) -> str:
+    timestamp = doc["timestamp"]
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return f"{int(timestamp.timestamp() * 1000)}-{doc['_id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError on a malformed cursor."""
+    millis, _, object_id = cursor.partition("-")
+    try:
+        return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), ObjectId(object_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+async def history(db, user: str, cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE,
+                  topic: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    A page of a user's exchanges, newest first, plus the cursor of the next page
+    (None on the last one). Keyset pagination on the (user, timestamp) index:
+    every page costs the same however deep the user scrolls.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query: Dict = {"user": user}
+    if topic:
+        query["topic"] = topic
+    if cursor:
+        timestamp, object_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": object_id}},
+        ]
+    docs = await (db[COLLECTION].find(query, {"user": 0})
+                  .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+                  .limit(limit + 1)
+                  .to_list(length=limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    items = []
+    for doc in docs[:limit]:
+        doc["id"] = str(doc.pop("_id"))
+        items.append(doc)
+    return items, next_cursor
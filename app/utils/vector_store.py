@@ -0,0 +1,199 @@
+# utils/vector_store.py
+import os
+import time
+import threading
+from typing import Dict, List, Tuple
+
+from chromadb import PersistentClient
+
+from app.utils import patent_store
+from app.utils.embedding_cache import get_embedding_function
+from app.utils.lexical_index import get_lexical_index
+from app.utils.topics import TOPIC_SEPARATOR, normalize_topic, topic_collection_name
+
+# === CONFIGURATION ===
+CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", os.path.join(os.path.dirname(__file__), "..", "chroma_db_patents"))
+COLLECTION_NAME = "patent_docs"
+CHUNK_COLLECTION_NAME = "patent_chunks"
+# "chroma" (float32 HNSW) or "quantized" (int8/float16 memory-mapped, see quantized_index)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "chroma").lower()
+# "local": each process opens the store itself; "remote": use the retrieval service
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "local").lower()
+
+
+class UnknownTopic(Exception):
+    """Raised when a search is scoped to a topic that has not been ingested."""
+
+    def __init__(self, topic: str):
+        super().__init__(f"Topic '{topic}' has not been ingested")
+        self.topic = topic
+
+
+class VectorStore:
+    """
+    The one vector index client of a process (Chroma, or the quantized index
+    with VECTOR_INDEX_BACKEND=quantized), with its embedding function, the global
+    document and chunk collections, per-topic partitions and the BM25 index kept
+    alongside. Shared by the API (through app.state), ingestion jobs and scripts.
+    """
+
+    remote = False
+
+    def __init__(self, path: str = None, backend: str = VECTOR_INDEX_BACKEND):
+        start = time.perf_counter()
+        self.backend = backend
+        self.embedding_fn = get_embedding_function()
+        if backend == "quantized":
+            from app.utils.quantized_index import QUANT_INDEX_DIR, QuantizedClient
+            self.path = path or QUANT_INDEX_DIR
+            self.client = QuantizedClient(self.path)
+        else:
+            self.path = path or CHROMA_DB_DIR
+            self.client = PersistentClient(path=self.path)
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME, embedding_function=self.embedding_fn)
+        self.chunk_collection = self.client.get_or_create_collection(
+            name=CHUNK_COLLECTION_NAME, embedding_function=self.embedding_fn)
+        self.lexical_index = get_lexical_index()
+        self.synced = set()
+        self.sync_lock = threading.Lock()
+        print(f"✅ Vector store ({backend}) at {self.path} opened in {time.perf_counter() - start:.2f}s "
+              f"({COLLECTION_NAME}, {CHUNK_COLLECTION_NAME})")
+
+    def warm_up(self) -> float:
+        """Load the embedding model and backfill the BM25 index so the first query is not slow."""
+        start = time.perf_counter()
+        self.embedding_fn(["warm up"])
+        self.ensure_lexical(self.collection)
+        self.ensure_lexical(self.chunk_collection)
+        elapsed = time.perf_counter() - start
+        print(f"🔥 Vector store warmed up in {elapsed:.2f}s")
+        return elapsed
+
+    def embed(self, texts: List[str]) -> List:
+        return self.embedding_fn(texts)
+
+    def ensure_lexical(self, collection):
+        """Index records stored before the BM25 index existed, once per collection and process."""
+        if collection.name in self.synced:
+            return
+        with self.sync_lock:
+            if collection.name not in self.synced:
+                self.lexical_index.sync(collection)
+                self.synced.add(collection.name)
+
+    def collections(self, topic: str = None) -> Tuple:
+        """The global collections, or the document and chunk partitions of an ingested topic."""
+        if not topic:
+            return self.collection, self.chunk_collection
+        try:
+            return tuple(
+                self.client.get_collection(topic_collection_name(base, topic), embedding_function=self.embedding_fn)
+                for base in (COLLECTION_NAME, CHUNK_COLLECTION_NAME)
+            )
+        except Exception:
+            raise UnknownTopic(topic)
+
+    def require_topic(self, topic: str):
+        """Raise UnknownTopic unless the topic has been ingested."""
+        self.collections(topic)
+
+    def mark_topic_complete(self, topic: str):
+        """Flag a topic as fully ingested; until then topic_exists() reports it missing."""
+        topic = normalize_topic(topic)
+        docs, _ = self.topic_collections(topic)
+        docs.modify(metadata={**(docs.metadata or {}), "topic": topic, "complete": True})
+
+    def topic_collections(self, topic: str) -> Tuple:
+        """Document and chunk partitions of a topic, created on first use."""
+        topic = normalize_topic(topic)
+        return tuple(
+            self.client.get_or_create_collection(
+                name=topic_collection_name(base, topic), embedding_function=self.embedding_fn,
+                metadata={"topic": topic})
+            for base in (COLLECTION_NAME, CHUNK_COLLECTION_NAME)
+        )
+
+    def _topic_collections(self) -> Dict[str, object]:
+        prefix = f"{COLLECTION_NAME}{TOPIC_SEPARATOR}"
+        topics = {}
+        for item in self.client.list_collections():
+            name = getattr(item, "name", item)
+            if name.startswith(prefix):
+                topics[name[len(prefix):]] = self.client.get_collection(name, embedding_function=self.embedding_fn)
+        return topics
+
+    def list_topics(self) -> List[Dict]:
+        """Every ingested topic with its document and chunk counts."""
+        topics = []
+        for topic, docs in sorted(self._topic_collections().items()):
+            chunks = self.client.get_or_create_collection(
+                topic_collection_name(CHUNK_COLLECTION_NAME, topic), embedding_function=self.embedding_fn)
+            topics.append({"topic": topic, "documents": docs.count(), "chunks": chunks.count(),
+                           "complete": bool((docs.metadata or {}).get("complete"))})
+        return topics
+
+    def topic_exists(self, topic: str) -> bool:
+        """
+        Whether the topic has been fully ingested. A job that failed partway
+        leaves its partition without the completion flag, so it is run again.
+        """
+        try:
+            docs = self.client.get_collection(topic_collection_name(COLLECTION_NAME, topic))
+        except Exception:
+            return False
+        return docs.count() > 0 and bool((docs.metadata or {}).get("complete"))
+
+    def drop_topic(self, topic: str) -> bool:
+        """
+        Remove a topic: its collections, its records in the global collections
+        (unless another topic shares them), its BM25 namespaces and its patent store
+        partition. Returns False if the topic was never ingested.
+        """
+        topic = normalize_topic(topic)
+        others = [name for name in self._topic_collections() if name != topic]
+        try:
+            self.require_topic(topic)  # not topic_exists(): a partial ingest is dropped too
+        except UnknownTopic:
+            patent_store.drop_topic(topic)
+            return False
+
+        for base, global_collection in ((COLLECTION_NAME, self.collection),
+                                        (CHUNK_COLLECTION_NAME, self.chunk_collection)):
+            name = topic_collection_name(base, topic)
+            ids = self.client.get_collection(name).get(include=[])["ids"]
+            shared = set()
+            for other in others if ids else ():
+                other_collection = self.client.get_or_create_collection(topic_collection_name(base, other))
+                shared.update(other_collection.get(ids=ids, include=[])["ids"])
+            orphaned = [doc_id for doc_id in ids if doc_id not in shared]
+            if orphaned:
+                global_collection.delete(ids=orphaned)
+                self.lexical_index.remove(global_collection.name, orphaned)
+            self.client.delete_collection(name)
+            self.lexical_index.drop(name)
+
+        patent_store.drop_topic(topic)
+        print(f"🗑️ Dropped topic '{topic}'")
+        return True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store(mode: str = None):
+    """
+    Process-wide vector store, opened on first use. In remote mode this is a
+    client of the retrieval service (app.utils.retrieval_service), which holds
+    the only open copy of the index and the embedding model.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if (mode or VECTOR_STORE_MODE) == "remote":
+                from app.utils.retrieval_service import RemoteVectorStore
+                _store = RemoteVectorStore()
+            else:
+                _store = VectorStore()
+    return _store
@@ -1,59 +1,175 @@
 # utils/vector_uploader.py
 import os
 import csv
-import uuid
-from typing import List, Dict
-from chromadb import PersistentClient
-from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+import time
+import hashlib
+from typing import List, Dict, Iterator, Optional
+
+from app.utils import patent_store
+from app.utils.chunker import chunk_patent
+from app.utils.metrics import INGEST_BATCH_SECONDS, INGEST_DOCUMENTS, INGEST_STAGE_SECONDS
+from app.utils.topics import normalize_topic
+from app.utils.vector_store import VectorStore, get_vector_store, COLLECTION_NAME
+
+# Fix field size limit for large patent data (Windows-safe)
+csv.field_size_limit(10_000_000)
 
 # === CONFIGURATION ===
-CHROMA_DB_DIR = os.path.join(os.path.dirname(
-    __file__), "..", "chroma_db_patents")
-COLLECTION_NAME = "patent_docs"
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_CHUNKS = os.getenv("INGEST_CHUNKS", "true").lower() == "true"
+
+
+def build_document(row: Dict[str, str]) -> str:
+    """Join the parsed patent sections into a single document text."""
+    return "\n\n".join([
+        f"PID: {row.get('pid', '')}",
+        f"Abstract: {row.get('Abstract', '')}",
+        f"Claims: {row.get('Claims', '')}",
+        f"Description: {row.get('Description', '')}"
+    ])
+
+
+def document_id(text: str) -> str:
+    """Content-derived ID, so the same document always maps to the same record."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def iter_batches(rows: Iterator[Dict[str, str]], batch_size: int) -> Iterator[List[Dict[str, str]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-# === INITIALIZATION ===
-print(f"🔧 Initializing ChromaDB client at: {CHROMA_DB_DIR}")
-embedding_fn = DefaultEmbeddingFunction()
 
-client = PersistentClient(path=CHROMA_DB_DIR)
-collection = client.get_or_create_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
-print(f"✅ Using collection: {COLLECTION_NAME}")
+def upsert_records(store: VectorStore, targets: List, records: List[Dict]) -> int:
+    """
+    Embed and upsert records ({"id", "text", "metadata"}) into one or more collections
+    (the global one and a topic partition) and their BM25 namespaces.
+    Records whose content ID is already stored are skipped, and each remaining
+    text is embedded once however many collections it goes into.
+    Returns the number of records new to the first collection.
+    """
+    docs = {record["id"]: record for record in records}
+    new_ids = {}
+    with INGEST_STAGE_SECONDS.time(stage="lookup"):
+        for target in targets:
+            existing = set(target.get(ids=list(docs), include=[])["ids"])
+            new_ids[target.name] = [doc_id for doc_id in docs if doc_id not in existing]
+
+    pending = list(dict.fromkeys(doc_id for ids in new_ids.values() for doc_id in ids))
+    with INGEST_STAGE_SECONDS.time(stage="embed"):
+        embeddings = dict(zip(pending, store.embedding_fn([docs[doc_id]["text"] for doc_id in pending]))) if pending else {}
+
+    for target in targets:
+        ids = new_ids[target.name]
+        if ids:
+            with INGEST_STAGE_SECONDS.time(stage="upsert"):
+                target.upsert(
+                    ids=ids,
+                    embeddings=[embeddings[doc_id] for doc_id in ids],
+                    documents=[docs[doc_id]["text"] for doc_id in ids],
+                    metadatas=[docs[doc_id]["metadata"] for doc_id in ids]
+                )
+        # Also covers records stored before the lexical index existed
+        with INGEST_STAGE_SECONDS.time(stage="lexical"):
+            store.lexical_index.add(target.name, list(docs.values()))
+    return len(new_ids[targets[0].name])
 
 
-def load_csv_to_vectordb(csv_path: str) -> int:
+def upsert_batch(store: VectorStore, rows: List[Dict[str, str]], topic: Optional[str] = None,
+                 chunked: bool = INGEST_CHUNKS, batch_size: int = BATCH_SIZE) -> int:
     """
-    Load documents from a parsed patent CSV into ChromaDB.
+    Upsert one batch of parsed patent rows as whole-patent documents and, optionally,
+    as section chunks, into the global collections and, given a topic, its partition.
+    Returns the number of new whole-patent documents.
+    """
+    if store.remote:
+        return store.upsert_batch(rows, topic, chunked, batch_size)
+    tags = {"ingested_at": int(time.time())}
+    doc_targets, chunk_targets = [store.collection], [store.chunk_collection]
+    if topic:
+        tags["topic"] = topic
+        topic_docs, topic_chunks = store.topic_collections(topic)
+        doc_targets.append(topic_docs)
+        chunk_targets.append(topic_chunks)
+
+    records = []
+    for row in rows:
+        text = build_document(row)
+        records.append({"id": document_id(text), "text": text, "metadata": {"pid": row.get("pid", ""), **tags}})
+    count = upsert_records(store, doc_targets, records)
+
+    if chunked:
+        chunks = [chunk for row in rows for chunk in chunk_patent(row)]
+        for chunk in chunks:
+            chunk["metadata"].update(tags)
+        for start in range(0, len(chunks), batch_size):
+            upsert_records(store, chunk_targets, chunks[start:start + batch_size])
+    return count
+
+
+def load_rows_to_vectordb(rows: Iterator[Dict[str, str]], source: str, topic: Optional[str] = None,
+                          batch_size: int = BATCH_SIZE, chunked: bool = INGEST_CHUNKS, progress=None,
+                          store: Optional[VectorStore] = None) -> int:
+    """
+    Load parsed patent rows into ChromaDB in batches, holding one batch in memory at a time.
+    Rows are tagged with their topic and ingest time and, given a topic, also go
+    into that topic's own collections. With chunked=True each patent is also
+    split into section chunks.
+    `progress(documents_embedded=...)` is called after each batch.
+    Re-loading the same rows is a no-op since IDs are derived from content.
+    Uses the process-wide vector store unless one is given.
     Returns the number of documents added.
     """
+    store = store or get_vector_store()
+    print(f"📄 Loading {source} (batch size {batch_size})")
+    start = time.perf_counter()
+    seen = 0
+    count = 0
+    for batch in iter_batches(rows, batch_size):
+        with INGEST_BATCH_SECONDS.time():
+            added = upsert_batch(store, batch, topic=topic, chunked=chunked, batch_size=batch_size)
+        INGEST_DOCUMENTS.inc(added, outcome="new")
+        INGEST_DOCUMENTS.inc(len(batch) - added, outcome="unchanged")
+        count += added
+        seen += len(batch)
+        print(f"📝 Processed {seen} rows, inserted {count} new documents...")
+        if progress:
+            progress(documents_embedded=seen)
+
+    # Only now does /topic/initiate treat the topic as ingested
+    if topic:
+        store.mark_topic_complete(topic)
+
+    elapsed = time.perf_counter() - start
+    rate = seen / elapsed if elapsed > 0 else 0.0
+    print(
+        f"🎉 Finished: {count} new / {seen - count} unchanged documents in collection "
+        f"'{COLLECTION_NAME}' ({elapsed:.2f}s, {rate:.1f} docs/s)")
+    return count
+
+
+def load_topic_to_vectordb(topic: str, batch_size: int = BATCH_SIZE, chunked: bool = INGEST_CHUNKS,
+                           progress=None, store: Optional[VectorStore] = None) -> int:
+    """Load a topic partition from the patent store into ChromaDB."""
+    if not patent_store.is_complete(topic):
+        raise FileNotFoundError(f"Topic not in patent store: {topic}")
+    return load_rows_to_vectordb(patent_store.read_columns(topic), f"topic '{topic}' from patent store", topic,
+                                 batch_size=batch_size, chunked=chunked, progress=progress, store=store)
+
+
+def load_csv_to_vectordb(csv_path: str, batch_size: int = BATCH_SIZE, chunked: bool = INGEST_CHUNKS,
+                         progress=None, store: Optional[VectorStore] = None) -> int:
+    """Load documents from a legacy `{topic}_50patents.csv` into ChromaDB in batches."""
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
 
-    print(f"📄 Loading CSV: {csv_path}")
-    count = 0
+    topic = os.path.basename(csv_path).replace("_50patents.csv", "")
     with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            doc_id = str(uuid.uuid4())
-            document_text = "\n\n".join([
-                f"PID: {row.get('pid', '')}",
-                f"Abstract: {row.get('Abstract', '')}",
-                f"Claims: {row.get('Claims', '')}",
-                f"Description: {row.get('Description', '')}"
-            ])
-
-            collection.add(
-                documents=[document_text],
-                metadatas=[{"pid": row.get("pid", "")}],
-                ids=[doc_id]
-            )
-            count += 1
-
-            if count % 10 == 0:
-                print(f"📝 Inserted {count} documents...")
+        return load_rows_to_vectordb(csv.DictReader(f), f"CSV: {csv_path}", normalize_topic(topic),
+                                     batch_size=batch_size, chunked=chunked, progress=progress, store=store)
 
-    print(
-        f"🎉 Finished inserting {count} documents into collection '{COLLECTION_NAME}'")
-    return count
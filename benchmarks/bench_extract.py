@@ -0,0 +1,107 @@
+# benchmarks/bench_extract.py
+"""
+Benchmark the HTML extractors on saved patent pages.
+
+Pages come from a directory of .html / .html.gz files (for example the crawl
+cache's objects/ directory) or, by default, are rendered from the bundled CSV.
+Each extractor runs in a fresh process so peak RSS is comparable.
+
+    python benchmarks/bench_extract.py --repeat 5
+    python benchmarks/bench_extract.py --pages-dir app/crawl_cache/objects --json results.json
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import resource
+import tracemalloc
+import multiprocessing
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def load_pages(pages_dir=None):
+    if not pages_dir:
+        from fixture_server import DEFAULT_CSV, load_patents, render_patent_page
+        return [render_patent_page(row).encode("utf-8") for row in load_patents(DEFAULT_CSV).values()]
+
+    pages = []
+    for dirpath, _, filenames in os.walk(pages_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if filename.endswith(".html.gz"):
+                with gzip.open(path, "rb") as f:
+                    pages.append(f.read())
+            elif filename.endswith(".html"):
+                with open(path, "rb") as f:
+                    pages.append(f.read())
+    return pages
+
+
+def run_extractor(name, pages, repeat, queue):
+    from app.utils.extractors import get_extractor
+    extractor = get_extractor(name)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extractor.extract_sections(page)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    outputs = [extractor.extract_sections(page) for page in pages]
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        "extractor": name,
+        "pages": len(pages) * repeat,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(len(pages) * repeat / elapsed, 1),
+        "python_heap_peak_mb": round(heap_peak / 2 ** 20, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "outputs": outputs,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark patent HTML extractors")
+    parser.add_argument("--pages-dir", help="directory with .html/.html.gz pages (default: render from CSV)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--extractors", default="bs4,lxml")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    mb = sum(len(p) for p in pages) / 2 ** 20
+    print(f"📚 {len(pages)} pages ({mb:.1f} MB), repeat {args.repeat}")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in args.extractors.split(","):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_extractor, args=(name, pages, args.repeat, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    reference = results[0].pop("outputs")
+    for result in results[1:]:
+        result["identical_to_" + results[0]["extractor"]] = result.pop("outputs") == reference
+
+    for result in results:
+        print(f"⏱️ {result['extractor']:>5}: {result['pages_per_sec']:>8.1f} pages/s, "
+              f"heap peak {result['python_heap_peak_mb']} MB, RSS peak {result['peak_rss_mb']} MB"
+              + (f", identical: {result.get('identical_to_' + results[0]['extractor'])}" if result is not results[0] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "extract", "pages": len(pages), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
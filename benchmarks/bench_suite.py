@@ -0,0 +1,374 @@
+# benchmarks/bench_suite.py
+"""
+Offline end-to-end benchmark: crawl, ingest, query and /api/chat under load.
+
+Everything runs locally: patent pages come from the fixture server (rendered
+from the bundled coffee CSV), the LLM is the stub backend, and all stores live
+in a scratch directory. Only the embedding model must already be in the local
+cache (~/.cache/chroma), as it is after any earlier run of the app.
+
+    python benchmarks/bench_suite.py --json results/baseline.json
+    python benchmarks/bench_suite.py --stages ingest,query --queries 200
+    python benchmarks/bench_suite.py --stages chat --redis-uri fakeredis:// --users 1,8,32
+    python benchmarks/compare.py results/baseline.json results/candidate.json
+
+The chat stage drives the FastAPI app in-process (needs Redis at --redis-uri,
+or `fakeredis://` with the fakeredis package installed), or a running server
+given --url. Each stage's results are written as one JSON document.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+import uuid
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fixture_server import DEFAULT_CSV, load_patents, start_server
+
+STAGES = ("crawl", "crawl_sync", "ingest", "query", "chat")
+QUESTIONS = [
+    "How do espresso machines control brewing pressure?",
+    "Which patents describe single-serve coffee capsules?",
+    "How is milk frothed with steam?",
+    "What methods are used for roasting coffee beans?",
+    "How do grinders adjust the grind size?",
+    "Which patents cover cold brew coffee extraction?",
+    "How is water temperature regulated during brewing?",
+    "What filters are used in drip coffee makers?",
+]
+
+
+def percentiles(samples):
+    """Nearest-rank p50/p95/p99, mean and max of a list of seconds, in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))] * 1000
+
+    return {
+        "p50_ms": round(rank(0.50), 2),
+        "p95_ms": round(rank(0.95), 2),
+        "p99_ms": round(rank(0.99), 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def build_questions(csv_path, count, seed=7):
+    """Generic topic questions plus questions built from patent abstracts, in a fixed order."""
+    rng = random.Random(seed)
+    questions = list(QUESTIONS)
+    for row in load_patents(csv_path).values():
+        words = row.get("Abstract", "").split()
+        if len(words) >= 12:
+            start = rng.randrange(0, len(words) - 10)
+            questions.append("What is known about " + " ".join(words[start:start + 8]).strip(".,;:") + "?")
+    rng.shuffle(questions)
+    return [questions[i % len(questions)] for i in range(count)]
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silence the app's progress prints while a stage is timed."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def configure_environment(args, workdir):
+    """Point every store at the scratch directory; must run before any app module is imported."""
+    os.environ.update({
+        "CHROMA_DB_DIR": os.path.join(workdir, "chroma"),
+        "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical_index"),
+        "EMBEDDING_CACHE_DIR": os.path.join(workdir, "embedding_cache"),
+        "PATENT_STORE_DIR": os.path.join(workdir, "patent_store"),
+        "CRAWL_CACHE_DIR": os.path.join(workdir, "crawl_cache"),
+        "CRAWL_CACHE_MODE": "off",  # every crawl fetch goes to the fixture server
+        "CRAWL_RATE_PER_HOST": str(args.crawl_rate),
+        "CRAWL_CONCURRENCY": str(args.crawl_concurrency),
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": str(args.llm_latency),
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "VECTOR_STORE_WARMUP": "false",
+        "VECTOR_STORE_MODE": "local",  # the suite measures the in-process store
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+
+
+def bench_crawl(args, base_url):
+    from app.utils import patent_store
+    from app.utils.async_crawler import parse_and_save_topic_async
+
+    progress = {}
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        asyncio.run(parse_and_save_topic_async("bench_async", progress=lambda **kw: progress.update(kw)))
+    elapsed = time.perf_counter() - start
+    pages = progress.get("pages_fetched", 0)
+    return {
+        "pages": pages,
+        "patents": (patent_store.read_meta("bench_async") or {}).get("rows", 0),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def bench_crawl_sync(args, base_url):
+    from app.utils import patent_parser, patent_store
+
+    # Measure the crawler itself, not its politeness delay
+    patent_parser.DELAY_BETWEEN_PATENTS = 0
+    progress = {}
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        patent_parser.parse_and_save_topic("bench_sync", progress=lambda **kw: progress.update(kw))
+    elapsed = time.perf_counter() - start
+    pages = progress.get("pages_fetched", 0)
+    return {
+        "pages": pages,
+        "patents": (patent_store.read_meta("bench_sync") or {}).get("rows", 0),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(pages / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def bench_ingest(args):
+    from app.utils.vector_store import get_vector_store
+    from app.utils.vector_uploader import load_csv_to_vectordb
+
+    store = get_vector_store()
+    rows = len(load_patents(args.csv))
+    results = {}
+    # Cold: nothing stored or cached yet. Repeat: every document is already stored.
+    for run in ("cold", "repeat"):
+        start = time.perf_counter()
+        with quiet(not args.verbose):
+            added = load_csv_to_vectordb(args.csv, store=store)
+        elapsed = time.perf_counter() - start
+        results[run] = {
+            "documents": rows,
+            "added": added,
+            "seconds": round(elapsed, 3),
+            "docs_per_sec": round(rows / elapsed, 2) if elapsed else 0.0,
+        }
+    results["chunks"] = store.chunk_collection.count()
+    return results
+
+
+def bench_queries(args, questions):
+    from app.chat_interface import run_query
+    from app.utils.vector_store import get_vector_store
+
+    store = get_vector_store()
+    store.warm_up()
+
+    async def run():
+        totals, stages = [], {}
+        for question in questions:
+            start = time.perf_counter()
+            _, _, usage = await run_query(question, topic=args.topic, store=store)
+            totals.append(time.perf_counter() - start)
+            for stage, ms in usage.get("latency_ms", {}).items():
+                stages.setdefault(stage, []).append(ms / 1000)
+        return totals, stages
+
+    with quiet(not args.verbose):
+        totals, stages = asyncio.run(run())
+    return {
+        "queries": len(questions),
+        "llm_latency_s": args.llm_latency,
+        "latency": percentiles(totals),
+        "stages": {stage: percentiles(samples) for stage, samples in stages.items()},
+        "queries_per_sec": round(len(totals) / sum(totals), 2) if totals else 0.0,
+    }
+
+
+async def _chat_load(client, new_session, questions, users, requests_per_user, topic):
+    """
+    `users` concurrent users, each in its own session sending its requests back
+    to back. Returns the run's results.
+    """
+    latencies, errors, cached = [], 0, 0
+
+    async def user(index):
+        nonlocal errors, cached
+        session_id = await new_session()
+        for i in range(requests_per_user):
+            question = questions[(index * requests_per_user + i) % len(questions)]
+            start = time.perf_counter()
+            try:
+                res = await client.post("/api/chat", json={"session_id": session_id, "message": question,
+                                                           "topic": topic})
+                res.raise_for_status()
+                cached += bool(res.json().get("usage", {}).get("cached"))
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    return {
+        "users": users,
+        "requests": users * requests_per_user,
+        "errors": errors,
+        "cached": cached,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles(latencies),
+    }
+
+
+async def _run_chat_levels(client, new_session, args, questions):
+    results = []
+    for users in [int(u) for u in args.users.split(",")]:
+        results.append(await _chat_load(client, new_session, questions, users, args.requests_per_user, args.topic))
+        print(f"   👥 {users:>3} users: {results[-1]['requests_per_sec']:>7.1f} req/s, "
+              f"p95 {results[-1]['latency'].get('p95_ms', 0):.0f} ms, {results[-1]['errors']} errors")
+    return results
+
+
+async def bench_chat_inprocess(args, questions):
+    import httpx
+    import main
+    from app.utils.session_cache import create_session
+
+    if args.redis_uri.startswith("fakeredis://"):
+        import fakeredis.aioredis
+        redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    else:
+        from app.utils.metrics import InstrumentedRedis
+        redis_client = InstrumentedRedis.from_url(args.redis_uri, decode_responses=True)
+    await redis_client.ping()
+    main.redis_client = main.app.state.redis = redis_client
+
+    async def new_session():
+        session_id = str(uuid.uuid4())
+        await create_session(redis_client, session_id, "bench@example.com")
+        return session_id
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await _run_chat_levels(client, new_session, args, questions)
+
+
+async def bench_chat_remote(args, questions):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120,
+                                 limits=httpx.Limits(max_connections=256)) as client:
+        credentials = {"email": "bench@example.com", "password": "bench-password"}
+        await client.post("/api/register", json=credentials)
+
+        async def new_session():
+            res = await client.post("/api/login", json=credentials)
+            res.raise_for_status()
+            return res.json()["session_id"]
+
+        return await _run_chat_levels(client, new_session, args, questions)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of crawl, ingest, query and chat")
+    parser.add_argument("--stages", default="crawl,ingest,query,chat", help=f"comma-separated: {','.join(STAGES)}")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="patents served by the fixture server and ingested")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--workdir", help="scratch directory for stores (default: a new temp dir)")
+    parser.add_argument("--crawl-latency", type=float, default=0.02, help="fixture server seconds per response")
+    parser.add_argument("--crawl-rate", type=float, default=100.0, help="crawler requests/s per host")
+    parser.add_argument("--crawl-concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="stub LLM seconds per completion")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--topic", default="coffee", help="topic queries are scoped to ('' for all)")
+    parser.add_argument("--users", default="1,8,32", help="concurrent chat users per load level")
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument("--redis-uri", default=os.getenv("REDIS_URI", "redis://localhost:6379"))
+    parser.add_argument("--url", help="load-test a running server instead of the in-process app")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on during chat (only a session's first question can hit it)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    args = parser.parse_args()
+    args.topic = args.topic or None
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="patentai-bench-")
+    configure_environment(args, workdir)
+    server, base_url = start_server(args.csv, latency=args.crawl_latency)
+    os.environ["PATENT_BASE_URL"] = base_url
+    print(f"🧪 Fixture server at {base_url}, stores in {workdir}")
+
+    questions = build_questions(args.csv, args.queries)
+    results = {}
+    for stage in stages:
+        print(f"⏱️ {stage}...")
+        if stage == "crawl":
+            results[stage] = bench_crawl(args, base_url)
+        elif stage == "crawl_sync":
+            results[stage] = bench_crawl_sync(args, base_url)
+        elif stage == "ingest":
+            results[stage] = bench_ingest(args)
+        elif stage == "query":
+            if "ingest" not in results:
+                bench_ingest(args)  # queries need an index
+            results[stage] = bench_queries(args, questions)
+        elif stage == "chat":
+            if "ingest" not in results and not args.url:
+                bench_ingest(args)
+            try:
+                run = bench_chat_remote if args.url else bench_chat_inprocess
+                results[stage] = {"target": args.url or "in-process", "levels": asyncio.run(run(args, questions))}
+            except Exception as e:
+                results[stage] = {"skipped": f"{type(e).__name__}: {e}"}
+        print(f"   {json.dumps(results[stage])[:300]}")
+    server.shutdown()
+
+    report = {
+        "benchmark": "suite",
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {key: value for key, value in vars(args).items() if key not in ("json", "verbose")},
+        "results": results,
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# benchmarks/bench_vector_index.py
+"""
+Recall and latency of the vector index backends on the same vectors: Chroma
+(float32 HNSW) against the quantized memory-mapped index (int8, int8 with
+exact re-scoring, float16). Recall@k is measured against an exact float32
+brute-force search.
+
+    python benchmarks/bench_vector_index.py --json benchmarks/results/index.json
+    python benchmarks/bench_vector_index.py --source csv --k 24
+    python benchmarks/bench_vector_index.py --count 100000 --backends chroma,int8
+
+Vectors are synthetic by default: clustered, unit-length, 384-dimensional
+like the app's embeddings, so no model is needed. `--source csv` embeds the
+section chunks of the bundled coffee patents instead and queries with short
+passages of them (needs the embedding model in the local cache).
+Results are keyed by backend name, so benchmarks/compare.py can compare runs.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_suite import git_commit, percentiles
+from fixture_server import DEFAULT_CSV, load_patents
+
+BACKENDS = {
+    "chroma": {},
+    "int8": {"dtype": "int8", "rescore": False},
+    "int8_rescore": {"dtype": "int8", "rescore": True},
+    "float16": {"dtype": "float16", "rescore": False},
+}
+INSERT_BATCH = 1000
+
+
+def synthetic_vectors(count, queries, dim, clusters, seed=7):
+    """Unit vectors around random cluster centres; queries are perturbed copies of random stored vectors."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.normal(size=(count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = vectors[rng.integers(0, count, queries)] + 0.5 * rng.normal(size=(queries, dim)) / np.sqrt(dim)
+    picks /= np.linalg.norm(picks, axis=1, keepdims=True)
+    return vectors.astype(np.float32), picks.astype(np.float32)
+
+
+def csv_vectors(csv_path, queries, seed=7):
+    """Embeddings of the patents' section chunks, and of short passages taken from some of them."""
+    from app.utils.chunker import chunk_patent
+    from app.utils.embedding_cache import get_embedding_function
+
+    embed = get_embedding_function()
+    texts = [chunk["text"] for row in load_patents(csv_path).values() for chunk in chunk_patent(row)]
+    rng = np.random.default_rng(seed)
+    passages = []
+    for index in rng.integers(0, len(texts), queries):
+        words = texts[index].split()
+        start = int(rng.integers(0, max(1, len(words) - 12)))
+        passages.append(" ".join(words[start:start + 12]))
+    vectors = np.concatenate([np.asarray(embed(texts[i:i + 256]), dtype=np.float32)
+                              for i in range(0, len(texts), 256)])
+    return vectors, np.asarray(embed(passages), dtype=np.float32)
+
+
+def exact_neighbours(vectors, queries, k):
+    """Ground truth: the k nearest stored vectors of each query by squared L2, in float32."""
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    truth = []
+    for start in range(0, len(queries), 64):
+        block = queries[start:start + 64]
+        distances = norms[None, :] - 2 * block @ vectors.T
+        truth.extend(np.argsort(distances, axis=1)[:, :k])
+    return np.array(truth)
+
+
+def open_collection(name, path):
+    if name == "chroma":
+        from chromadb import PersistentClient
+        return PersistentClient(path=path).get_or_create_collection("bench", embedding_function=None)
+    from app.utils.quantized_index import QuantizedClient
+    return QuantizedClient(path, **BACKENDS[name]).get_or_create_collection("bench")
+
+
+def disk_mb(path):
+    total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return round(total / 2 ** 20, 2)
+
+
+def bench_backend(name, path, vectors, queries, truth, args):
+    collection = open_collection(name, path)
+    ids = [str(i) for i in range(len(vectors))]
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), INSERT_BATCH):
+        batch = slice(offset, offset + INSERT_BATCH)
+        collection.upsert(ids=ids[batch], embeddings=vectors[batch],
+                          documents=[f"doc {i}" for i in ids[batch]], metadatas=[{"n": i} for i in range(
+                              offset, min(offset + INSERT_BATCH, len(vectors)))])
+    insert_seconds = time.perf_counter() - start
+
+    # One query per call, as /api/chat searches
+    latencies, hits = [], 0
+    for index, query in enumerate(queries):
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query], n_results=args.k, include=["distances"])
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(doc_id) for doc_id in found["ids"][0]} & set(truth[index].tolist()))
+
+    # Many queries per call, as /api/search batches them
+    start = time.perf_counter()
+    for offset in range(0, len(queries), args.batch):
+        collection.query(query_embeddings=queries[offset:offset + args.batch], n_results=args.k,
+                         include=["distances"])
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "name": name,
+        "vectors": len(vectors),
+        "recall": round(hits / (len(queries) * args.k), 4),
+        "latency": percentiles(latencies),
+        "queries_per_sec": round(len(queries) / sum(latencies), 1),
+        "batched_queries_per_sec": round(len(queries) / batch_seconds, 1),
+        "insert_per_sec": round(len(vectors) / insert_seconds, 1),
+        "disk_mb": disk_mb(path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency comparison of the vector index backends")
+    parser.add_argument("--source", choices=("synthetic", "csv"), default="synthetic")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="patents embedded with --source csv")
+    parser.add_argument("--count", type=int, default=20000, help="synthetic vectors stored")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=64, help="queries per call in the batched run")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"comma-separated: {','.join(BACKENDS)}")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--workdir", help="scratch directory for the indexes (default: a new temp dir)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = set(names) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+
+    if args.source == "csv":
+        vectors, queries = csv_vectors(args.csv, args.queries)
+    else:
+        vectors, queries = synthetic_vectors(args.count, args.queries, args.dim, args.clusters)
+    truth = exact_neighbours(vectors, queries, args.k)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="patentai-index-bench-")
+    print(f"🧪 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}, in {workdir}")
+
+    results = []
+    for name in names:
+        path = os.path.join(workdir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        results.append(bench_backend(name, path, vectors, queries, truth, args))
+        row = results[-1]
+        print(f"   {name:<13} recall {row['recall']:.3f}  p50 {row['latency']['p50_ms']:.2f}ms  "
+              f"p95 {row['latency']['p95_ms']:.2f}ms  batched {row['batched_queries_per_sec']:.0f} q/s  "
+              f"insert {row['insert_per_sec']:.0f}/s  disk {row['disk_mb']:.1f}MB")
+
+    report = {
+        "benchmark": "vector_index",
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {key: value for key, value in vars(args).items() if key not in ("json",)},
+        "results": {"backends": results},
+    }
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
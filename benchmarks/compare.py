@@ -0,0 +1,98 @@
+# benchmarks/compare.py
+"""
+Compare two benchmark result files (bench_suite.py, bench_extract.py or
+bench_vector_index.py --json).
+
+Every numeric result is matched by its path, e.g. `query.latency.p95_ms` or
+`chat.levels[users=8].requests_per_sec`, and shown with its relative change.
+Changes beyond --threshold in the bad direction are flagged as regressions.
+
+    python benchmarks/compare.py results/baseline.json results/candidate.json
+    python benchmarks/compare.py base.json new.json --threshold 10 --fail-on-regression
+"""
+import sys
+import json
+import argparse
+
+HIGHER_IS_BETTER = ("_per_sec", "recall")
+LOWER_IS_BETTER = ("_ms", "seconds", "errors", "_mb")
+
+
+def flatten(value, path="", out=None):
+    """Numeric leaves of a results tree by path; list items are keyed by their identifying field."""
+    out = {} if out is None else out
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(item, f"{path}.{key}" if path else key, out)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            label = index
+            if isinstance(item, dict):
+                for field in ("users", "extractor", "name"):
+                    if field in item:
+                        label = f"{field}={item[field]}"
+                        break
+            flatten(item, f"{path}[{label}]", out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[path] = float(value)
+    return out
+
+
+def direction(path):
+    """+1 if higher is better, -1 if lower is better, 0 if the metric is informational."""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(base, new, threshold):
+    """Rows of (path, base, new, change %, verdict) for metrics present in both files."""
+    base_metrics, new_metrics = flatten(base.get("results", base)), flatten(new.get("results", new))
+    rows = []
+    for path in sorted(base_metrics.keys() & new_metrics.keys()):
+        old, current = base_metrics[path], new_metrics[path]
+        change = (current - old) / old * 100 if old else 0.0
+        sign = direction(path)
+        verdict = ""
+        if sign and abs(change) >= threshold:
+            verdict = "better" if change * sign > 0 else "REGRESSION"
+        rows.append((path, old, current, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=5.0, help="percent change that counts")
+    parser.add_argument("--all", action="store_true", help="also list informational metrics")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"📊 {args.base} ({base.get('git_commit') or '?'}) -> {args.new} ({new.get('git_commit') or '?'})")
+    base_settings, new_settings = base.get("settings", {}), new.get("settings", {})
+    for key in sorted(base_settings.keys() & new_settings.keys() - {"workdir", "stages"}):
+        if base_settings[key] != new_settings[key]:
+            print(f"⚠️ Setting {key} differs: {base_settings[key]} -> {new_settings[key]}")
+    rows = [row for row in compare(base, new, args.threshold) if args.all or direction(row[0])]
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'metric':<{width}}  {'base':>12}  {'new':>12}  {'change':>8}")
+    for path, old, current, change, verdict in rows:
+        print(f"{path:<{width}}  {old:>12.2f}  {current:>12.2f}  {change:>+7.1f}%  {verdict}")
+
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    print(f"{'❌' if regressions else '✅'} {len(regressions)} regression(s) beyond {args.threshold:.0f}%")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
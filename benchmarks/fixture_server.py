@@ -0,0 +1,113 @@
+# benchmarks/fixture_server.py
+"""
+Local stand-in for freepatentsonline.com, rendered from a parsed patent CSV.
+
+Serves result pages (/result.html?p=N) and patent pages (/<pid>.html) in the
+markup the parser expects, with optional latency and error injection.
+
+    python benchmarks/fixture_server.py --port 8765 --latency 0.2
+    PATENT_BASE_URL=http://127.0.0.1:8765 python -m app.utils.async_crawler coffee
+"""
+import os
+import csv
+import html
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+csv.field_size_limit(10_000_000)
+
+DEFAULT_CSV = os.path.join(os.path.dirname(__file__), "..", "app", "parsed_patents", "coffee_50patents.csv")
+
+
+def load_patents(csv_path):
+    with open(csv_path, "r", encoding="utf-8") as f:
+        return {row["pid"]: row for row in csv.DictReader(f)}
+
+
+def render_result_page(pids):
+    rows = "\n".join(
+        f'<tr><td width="15%" valign="top">{html.escape(pid)}</td><td>Patent {html.escape(pid)}</td></tr>'
+        for pid in pids
+    )
+    return f"<html><body><table>\n{rows}\n</table></body></html>"
+
+
+def render_patent_page(row):
+    blocks = []
+    for section in ("Abstract", "Claims", "Description"):
+        if row.get(section):
+            blocks.append(
+                '<div class="disp_doc2">'
+                f'<div class="disp_elm_title">{section}:</div>'
+                f'<div class="disp_elm_text">{html.escape(row[section])}</div>'
+                '</div>'
+            )
+    return f"<html><body><h1>{html.escape(row['pid'])}</h1>\n" + "\n".join(blocks) + "\n</body></html>"
+
+
+def make_handler(patents, page_size, latency, fail_rate):
+    pids = list(patents)
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_html(self, status, body):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                self.send_html(503, "<html><body>Service Unavailable</body></html>")
+                return
+
+            parts = urlsplit(self.path)
+            if parts.path == "/result.html":
+                page = int(parse_qs(parts.query).get("p", ["1"])[0])
+                start = (page - 1) * page_size
+                self.send_html(200, render_result_page(pids[start:start + page_size]))
+                return
+
+            pid = parts.path.strip("/").replace("/", "").removesuffix(".html")
+            if pid in patents:
+                self.send_html(200, render_patent_page(patents[pid]))
+            else:
+                self.send_html(404, "<html><body>Not Found</body></html>")
+
+    return FixtureHandler
+
+
+def start_server(csv_path=DEFAULT_CSV, port=0, page_size=10, latency=0.0, fail_rate=0.0):
+    """Start the fixture server in a daemon thread. Returns (server, base_url)."""
+    handler = make_handler(load_patents(csv_path), page_size, latency, fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fixture patent pages")
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.csv, args.port, args.page_size, args.latency, args.fail_rate)
+    print(f"🧪 Fixture server running at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
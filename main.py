@@ -1,21 +1,83 @@
 # app/main.py
+import time
+STARTUP_STARTED = time.perf_counter()
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+load_dotenv()  # before any app module reads its configuration
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-import redis.asyncio as redis
-import os
 
-from app.routes import auth, chat, topic  # <- added topic
+from app.routes import auth, chat, search, topic  # <- added topic
+from app.utils import metrics, transcripts
+from app.utils.session_cache import listen_for_invalidations
+from app.utils.tracing import TraceMiddleware, configure_logging
 
 # === ENVIRONMENT SETUP ===
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017")
 REDIS_URI = os.getenv("REDIS_URI", "redis://redis:6379")
+VECTOR_STORE_WARMUP = os.getenv("VECTOR_STORE_WARMUP", "true").lower() == "true"
+
+configure_logging()
+TRANSCRIPT_STATS = metrics.Gauge(
+    "patentai_transcripts", "Chat transcripts queued, written, dropped and failed by this worker.", ["stat"])
+
+
+async def ensure_indexes(db):
+    """
+    Logins look users up by email; the unique index also rejects duplicate
+    registrations. Chat history pages through transcripts by (user, timestamp).
+    """
+    try:
+        await db.users.create_index("email", unique=True)
+        await transcripts.ensure_indexes(db)
+    except Exception as e:
+        print(f"⚠️ Could not ensure MongoDB indexes: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared vector store once per worker and, optionally, load the embedding model."""
+    from app.utils.vector_store import get_vector_store
+
+    started = time.perf_counter()
+    timings = {"imports": started - STARTUP_STARTED}
+    app.state.vector_store = await asyncio.to_thread(get_vector_store)
+    timings["vector_store"] = time.perf_counter() - started
+    if VECTOR_STORE_WARMUP:
+        timings["warm_up"] = await asyncio.to_thread(app.state.vector_store.warm_up)
+    timings["total"] = time.perf_counter() - STARTUP_STARTED
+    app.state.startup_timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    print(f"🚀 Startup finished in {timings['total']:.2f}s: {app.state.startup_timings}")
+
+    app.state.transcripts = transcripts.TranscriptWriter(app.state.mongo)
+    app.state.transcripts.start()
+    TRANSCRIPT_STATS.set_function(app.state.transcripts.stats)
+    background = [
+        asyncio.create_task(ensure_indexes(app.state.mongo)),
+        asyncio.create_task(listen_for_invalidations(redis_client)),
+    ]
+
+    yield
+
+    for task in background:
+        task.cancel()
+    await app.state.transcripts.close()
+    await redis_client.aclose()
+    mongo_client.close()
+
 
 # === INIT FASTAPI ===
 app = FastAPI(
     title="PatentAI",
     description="API for user auth, topic-based patent parsing, vectorization, and LLM chat",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -24,11 +86,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-ID"],
 )
+app.add_middleware(TraceMiddleware)
 
 # === DB CLIENTS ===
-mongo_client = AsyncIOMotorClient(MONGO_URI)
-redis_client = redis.from_url(REDIS_URI, decode_responses=True)
+mongo_client = AsyncIOMotorClient(MONGO_URI, event_listeners=[metrics.MongoCommandMetrics()])
+redis_client = metrics.InstrumentedRedis.from_url(REDIS_URI, decode_responses=True)
 
 # === SHARED STATE ===
 app.state.mongo = mongo_client.patentbot
@@ -38,3 +102,15 @@ app.state.redis = redis_client
 app.include_router(auth.router, prefix="/api", tags=["Auth"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
 app.include_router(topic.router, prefix="/api", tags=["Topic"])
+app.include_router(search.router, prefix="/api", tags=["Search"])
+
+
+@app.get("/health", tags=["Health"])
+async def health():
+    return {"status": "ok", "startup": getattr(app.state, "startup_timings", None)}
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Latency histograms and counters of this worker, in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")